@@ -0,0 +1,74 @@
+# Background analysis for the Qt UI: searches run in a separate process so the window never waits on them,
+# and progressively deeper results come back to the GUI thread through Qt signals
+import multiprocessing
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from notation import write_fen
+# The worker process only imports this module, so it starts without loading Qt
+from analysis_process import serve
+
+
+class _Listener(QThread):
+    # Blocks on the result queue off the GUI thread, signals are delivered to the GUI thread by Qt
+    received = pyqtSignal(object)
+
+    def __init__(self, results, parent=None):
+        super().__init__(parent)
+        self.results = results
+
+    def run(self):
+        while True:
+            message = self.results.get()
+            if message is None:
+                break
+            self.received.emit(message)
+
+
+class AnalysisWorker(QObject):
+    # result(dict) is emitted for every completed depth of the current request,
+    # finished(request id) once its search has ended. Results for superseded requests are never emitted
+    result = pyqtSignal(dict)
+    finished = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # A fresh interpreter rather than a fork of the one running Qt
+        context = multiprocessing.get_context("spawn")
+        self.requests, self.results = context.Queue(), context.Queue()
+        self.latest = context.Value("i", 0, lock=False)
+        self.request_id = 0
+        self.process = context.Process(target=serve, args=(self.requests, self.results, self.latest), daemon=True)
+        self.process.start()
+        self.listener = _Listener(self.results, self)
+        self.listener.received.connect(self._received)
+        self.listener.start()
+
+    def analyse(self, board, max_depth=64, time_limit=None):
+        # Starts analysing the board's current position, abandoning whatever was being analysed before
+        self.request_id += 1
+        self.latest.value = self.request_id
+        self.requests.put((self.request_id, write_fen(board), max_depth, time_limit))
+        return self.request_id
+
+    def cancel(self):
+        self.request_id += 1
+        self.latest.value = self.request_id
+
+    def shutdown(self):
+        self.cancel()
+        self.requests.put(None)
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.results.put(None)
+        self.listener.wait()
+
+    def _received(self, message):
+        kind, request_id, data = message
+        if request_id != self.request_id:
+            return
+        if kind == "result":
+            self.result.emit(data)
+        else:
+            self.finished.emit(request_id)
@@ -0,0 +1,56 @@
+# The worker-process half of analysis.py: searches the positions the GUI sends and puts the results on a queue
+# Nothing here touches Qt, so a spawned worker is running after importing just the engine
+from internal import InternalBoard
+from search import Search
+from notation import load_fen, move_to_san
+from zobrist import TranspositionTable
+
+
+class _Superseded:
+    # Stop condition for the search in the worker: true as soon as a newer request (or a cancel) has been made
+
+    def __init__(self, latest, request_id):
+        self.latest = latest
+        self.request_id = request_id
+
+    def is_set(self):
+        return self.latest.value != self.request_id
+
+
+def serve(requests, results, latest):
+    # Runs in the worker process until it receives None
+    table = TranspositionTable(32)
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        request_id, fen, max_depth, time_limit = request
+        if request_id != latest.value:
+            continue
+        board = load_fen(InternalBoard(), fen)
+
+        def report(result):
+            # Name the moves from the analysed position, then put the board back for the search. The line stops
+            # at any move that isn't legal where it is played, rather than corrupting the board
+            san = []
+            try:
+                for move in result.pv:
+                    if not board.filter_legal([move]):
+                        break
+                    name = move_to_san(board, move)
+                    board.make_move(move)
+                    san.append(name)
+            finally:
+                for _ in san:
+                    board.unmake_move()
+            results.put(("result", request_id, {
+                "depth": result.depth,
+                "score": result.score,
+                "best_move": result.best_move,
+                "pv": san,
+                "nodes": result.nodes,
+                "nps": result.nps,
+            }))
+
+        Search(board, table).search(max_depth, time_limit, callback=report, stop=_Superseded(latest, request_id))
+        results.put(("finished", request_id, None))
@@ -0,0 +1,188 @@
+# Bitboard representation of the board
+# Square n maps to (row, col) = (n // 8, n % 8), the same numbering InternalBoard.to_xy uses,
+# So bit 0 is the white queen's rook square and bit 63 is the black king's rook square
+
+PIECE_TYPES = ["pawn", "knight", "bishop", "rook", "queen", "king"]
+COLOURS = ["white", "black"]
+
+FULL = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_B = FILE_A << 1
+FILE_G = FILE_A << 6
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+NOT_FILE_AB = FULL ^ (FILE_A | FILE_B)
+NOT_FILE_GH = FULL ^ (FILE_G | FILE_H)
+
+# Single steps in each direction, named the same way as the old _get_directions lists
+# "up" moves towards row 0 and "down" towards row 7
+SHIFTS = {
+    "up": lambda mask: mask >> 8,
+    "down": lambda mask: (mask << 8) & FULL,
+    "left": lambda mask: (mask & NOT_FILE_A) >> 1,
+    "right": lambda mask: ((mask & NOT_FILE_H) << 1) & FULL,
+    "ne": lambda mask: (mask & NOT_FILE_H) >> 7,
+    "nw": lambda mask: (mask & NOT_FILE_A) >> 9,
+    "se": lambda mask: ((mask & NOT_FILE_H) << 9) & FULL,
+    "sw": lambda mask: ((mask & NOT_FILE_A) << 7) & FULL,
+}
+ROOK_DIRECTIONS = ["up", "down", "left", "right"]
+BISHOP_DIRECTIONS = ["ne", "nw", "se", "sw"]
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+
+def bit(square):
+    return 1 << square
+
+
+def to_square(pos):
+    return pos[0] * 8 + pos[1]
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+def squares(mask):
+    # Yield the index of every set bit, lowest first
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def knight_attacks(mask):
+    return (
+        ((mask & NOT_FILE_H) << 17) | ((mask & NOT_FILE_A) << 15)
+        | ((mask & NOT_FILE_GH) << 10) | ((mask & NOT_FILE_AB) << 6)
+        | ((mask & NOT_FILE_A) >> 17) | ((mask & NOT_FILE_H) >> 15)
+        | ((mask & NOT_FILE_AB) >> 10) | ((mask & NOT_FILE_GH) >> 6)
+    ) & FULL
+
+
+def king_attacks(mask):
+    attacks = mask | SHIFTS["left"](mask) | SHIFTS["right"](mask)
+    attacks |= SHIFTS["up"](attacks) | SHIFTS["down"](attacks)
+    return attacks ^ mask
+
+
+def pawn_attacks(mask, colour):
+    # White pawns advance down the rows (towards row 7), black pawns up
+    if colour == "white":
+        return SHIFTS["se"](mask) | SHIFTS["sw"](mask)
+    return SHIFTS["ne"](mask) | SHIFTS["nw"](mask)
+
+
+# Lookup tables, built once at import time
+# RAYS[direction][square] is every square a slider on an empty board reaches in that direction,
+# RAY_POSITIONS holds the same squares as (row, col) pairs in the order they are walked
+RAYS = {direction: [] for direction in SHIFTS}
+RAY_POSITIONS = {direction: [] for direction in SHIFTS}
+for _direction, _step in SHIFTS.items():
+    for _square in range(64):
+        _ray, _positions = 0, []
+        _mask = _step(bit(_square))
+        while _mask:
+            _ray |= _mask
+            _positions.append(divmod(_mask.bit_length() - 1, 8))
+            _mask = _step(_mask)
+        RAYS[_direction].append(_ray)
+        RAY_POSITIONS[_direction].append(tuple(_positions))
+del _direction, _step, _square, _ray, _positions, _mask
+# Directions that walk towards higher square numbers, so the nearest blocker is the lowest bit
+POSITIVE_DIRECTIONS = {"down", "right", "se", "sw"}
+
+KNIGHT_ATTACKS = [knight_attacks(bit(_square)) for _square in range(64)]
+KING_ATTACKS = [king_attacks(bit(_square)) for _square in range(64)]
+PAWN_ATTACKS = {colour: [pawn_attacks(bit(_square), colour) for _square in range(64)] for colour in COLOURS}
+PAWN_PUSHES = {
+    "white": [SHIFTS["down"](bit(_square)) for _square in range(64)],
+    "black": [SHIFTS["up"](bit(_square)) for _square in range(64)],
+}
+# Only pawns still on their starting row have a double push
+PAWN_DOUBLE_PUSHES = {
+    "white": [bit(_square + 16) if 8 <= _square < 16 else 0 for _square in range(64)],
+    "black": [bit(_square - 16) if 48 <= _square < 56 else 0 for _square in range(64)],
+}
+
+
+def ray_attacks(square, direction, occupied):
+    # Squares reached from the square up to and including the first occupied one
+    ray = RAYS[direction][square]
+    blockers = ray & occupied
+    if not blockers:
+        return ray
+    if direction in POSITIVE_DIRECTIONS:
+        nearest = (blockers & -blockers).bit_length() - 1
+    else:
+        nearest = blockers.bit_length() - 1
+    return ray ^ RAYS[direction][nearest]
+
+
+class Bitboards:
+
+    def __init__(self):
+        # One mask per piece type and colour, plus occupancy for each side and the whole board
+        self.pieces = {colour: {type: 0 for type in PIECE_TYPES} for colour in COLOURS}
+        self.occupied = {colour: 0 for colour in COLOURS}
+        self.all = 0
+
+    @classmethod
+    def from_board(cls, board):
+        bitboards = cls()
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece != 0:
+                    bitboards.add(row * 8 + col, piece)
+        return bitboards
+
+    def add(self, square, piece):
+        mask = bit(square)
+        self.pieces[piece.colour][piece.type] |= mask
+        self.occupied[piece.colour] |= mask
+        self.all |= mask
+
+    def remove(self, square, piece):
+        mask = FULL ^ bit(square)
+        self.pieces[piece.colour][piece.type] &= mask
+        self.occupied[piece.colour] &= mask
+        self.all &= mask
+
+    def move(self, start, end, piece, captured=0):
+        if captured != 0:
+            self.remove(end, captured)
+        self.remove(start, piece)
+        self.add(end, piece)
+
+    def piece_type_at(self, square, colour):
+        mask = bit(square)
+        if not self.occupied[colour] & mask:
+            return None
+        for type, pieces in self.pieces[colour].items():
+            if pieces & mask:
+                return type
+
+    def __repr__(self):
+        return "\n".join(format(self.all >> (row * 8) & 0xFF, "08b")[::-1] for row in range(8))
+
+
+# Moves packed into 16 bits the way Polyglot books store them:
+# End square in bits 0-5, start square in bits 6-11 and the promotion piece in bits 12-14
+PROMOTIONS = [None, "knight", "bishop", "rook", "queen"]
+
+
+def encode_move(move):
+    code = to_square(move[1]) | to_square(move[0]) << 6
+    if len(move) > 2 and move[2] is not None:
+        code |= PROMOTIONS.index(move[2]) << 12
+    return code
+
+
+def decode_move(code):
+    start, end = divmod((code >> 6) & 63, 8), divmod(code & 63, 8)
+    promotion = PROMOTIONS[(code >> 12) & 7]
+    if promotion is None:
+        return start, end
+    return start, end, promotion
@@ -0,0 +1,122 @@
+# Board drawn by a single widget: squares, pieces, highlights and the dragged piece all come from one
+# paintEvent, and clicks are turned into squares arithmetically instead of asking 64 labels underMouse()
+import os
+import sys
+
+from PyQt5.QtCore import Qt, QRect, QPoint
+from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtWidgets import QApplication, QWidget
+
+from internal import InternalBoard
+from pixmaps import PixmapCache
+import logs
+
+
+class BoardView(QWidget):
+
+    def __init__(self, internal=None, parent=None):
+        super().__init__(parent)
+        self.base_path = os.path.join(os.path.dirname(sys.argv[0]), "assets")
+        self.pixmaps = PixmapCache(self.base_path)
+        self.internal = internal if internal is not None else InternalBoard()
+        if not hasattr(self.internal, "board"):
+            self.internal.start()
+        self.light = QColor(217, 200, 168)
+        self.dark = QColor(68, 40, 28)
+        self.highlight = QColor(120, 150, 20, 160)
+        self.piece_padding = 3
+        # Square being dragged and where the cursor is, or None
+        self.drag = None
+        self.setMinimumSize(160, 160)
+
+    def square_size(self):
+        return max(1, min(self.width(), self.height()) // 8)
+
+    def piece_size(self):
+        return max(1, self.square_size() - self.piece_padding * 2)
+
+    def square_at(self, point):
+        size = self.square_size()
+        row, col = point.y() // size, point.x() // size
+        if 0 <= row < 8 and 0 <= col < 8:
+            return row, col
+        return None
+
+    def square_rect(self, pos):
+        size = self.square_size()
+        return QRect(pos[1] * size, pos[0] * size, size, size)
+
+    def drag_rect(self):
+        size = self.square_size()
+        return QRect(self.drag[1].x() - size // 2, self.drag[1].y() - size // 2, size, size)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        dirty = event.rect()
+        padding = QPoint(self.piece_padding, self.piece_padding)
+        radius = self.square_size() // 2
+        for row in range(8):
+            for col in range(8):
+                rect = self.square_rect((row, col))
+                if not rect.intersects(dirty):
+                    continue
+                painter.fillRect(rect, self.light if (row + col) % 2 == 0 else self.dark)
+                if (row, col) in self.internal.highlighted:
+                    painter.setPen(Qt.NoPen)
+                    painter.setBrush(self.highlight)
+                    painter.drawRoundedRect(rect.adjusted(self.piece_padding, self.piece_padding,
+                                                          -self.piece_padding, -self.piece_padding), radius, radius)
+                piece = self.internal.piece_at((row, col))
+                if piece != 0 and (self.drag is None or self.drag[0] != (row, col)):
+                    painter.drawPixmap(rect.topLeft() + padding, self.pixmaps.piece(piece, self.piece_size()))
+        if self.drag is not None:
+            piece = self.internal.piece_at(self.drag[0])
+            painter.drawPixmap(self.drag_rect().topLeft() + padding, self.pixmaps.piece(piece, self.piece_size()))
+
+    def resizeEvent(self, event):
+        self.pixmaps.resize(self.piece_size())
+        super().resizeEvent(event)
+
+    def apply_changes(self, changes):
+        # Schedule a repaint of just the squares a click changed
+        for squares in changes:
+            for pos in squares:
+                self.update(self.square_rect(pos))
+
+    def mousePressEvent(self, event):
+        pos = self.square_at(event.pos())
+        if pos is None or event.button() != Qt.LeftButton:
+            return
+        self.apply_changes(self.internal.process_click_changes(pos))
+        # Picking up one of your own pieces starts a drag
+        if self.internal.selected == pos:
+            self.drag = (pos, event.pos())
+
+    def mouseMoveEvent(self, event):
+        if self.drag is None:
+            return
+        old = self.drag_rect()
+        self.drag = (self.drag[0], event.pos())
+        self.update(old.united(self.drag_rect()))
+
+    def mouseReleaseEvent(self, event):
+        if self.drag is None:
+            return
+        start = self.drag[0]
+        self.update(self.drag_rect())
+        self.update(self.square_rect(start))
+        self.drag = None
+        end = self.square_at(event.pos())
+        # Dropping the piece on another square is the same as clicking that square
+        if end is not None and end != start:
+            self.apply_changes(self.internal.process_click_changes(end))
+
+
+if __name__ == "__main__":
+    logs.configure()
+    app = QApplication(sys.argv)
+    view = BoardView()
+    view.setWindowTitle("Chess")
+    view.resize(640, 640)
+    view.show()
+    sys.exit(app.exec())
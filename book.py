@@ -0,0 +1,252 @@
+# Opening book in the Polyglot file layout: 16-byte big-endian entries (key, move, weight, learn) sorted by key.
+# The file is memory-mapped and binary searched, so a probe reads a few pages and nothing is loaded up front,
+# and every process using the same book shares the one copy in the page cache
+# Usage:
+#   python book.py build games.pgn book.bin --plies 20
+#   python book.py probe book.bin --fen "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+#   python book.py check games.pgn book.bin --plies 20   (every move the book was built from is found from its FEN)
+#
+# Polyglot books are keyed with the 781 Random64 numbers from the Polyglot source, which aren't shipped here.
+# Pass them as a file of 781 big-endian 64-bit words (--keys / load_keys) to read and write standard books,
+# without one the book is keyed by zobrist.position_key and only readable by this module
+import time
+import mmap
+import random
+import struct
+import argparse
+from collections import Counter
+
+from notation import START_FEN, NotationError, load_fen, write_fen, read_games, move_name
+from bitboard import PIECE_TYPES, PAWN_ATTACKS, squares, to_square, encode_move, decode_move
+from zobrist import position_key
+
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+RANDOM64_SIZE = 781
+# Offsets into the Random64 table after the 768 piece-square keys
+CASTLING_OFFSET = 768
+EN_PASSANT_OFFSET = 772
+TURN_OFFSET = 780
+
+
+class BookError(ValueError):
+    pass
+
+
+def load_keys(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) != RANDOM64_SIZE * 8:
+        raise BookError(f"{path} should hold {RANDOM64_SIZE} 64-bit keys, not {len(data)} bytes")
+    return struct.unpack(f">{RANDOM64_SIZE}Q", data)
+
+
+def polyglot_hash(board, keys):
+    # The Polyglot key of an InternalBoard position for the given Random64 table
+    key = 0
+    for colour in ("white", "black"):
+        for type, mask in board.bitboards.pieces[colour].items():
+            kind = 2 * PIECE_TYPES.index(type) + (colour == "white")
+            for square in squares(mask):
+                key ^= keys[64 * kind + square]
+    # White short, white long, black short, black long
+    rights = [not board.white_king_moved and not board.white_right_rook_moved,
+              not board.white_king_moved and not board.white_left_rook_moved,
+              not board.black_king_moved and not board.black_right_rook_moved,
+              not board.black_king_moved and not board.black_left_rook_moved]
+    for offset, allowed in enumerate(rights):
+        if allowed:
+            key ^= keys[CASTLING_OFFSET + offset]
+    # The en passant file only counts when a pawn of the side to move could actually take there
+    if board.en_passant is not None:
+        them = "black" if board.turn == "white" else "white"
+        if PAWN_ATTACKS[them][to_square(board.en_passant)] & board.bitboards.pieces[board.turn]["pawn"]:
+            key ^= keys[EN_PASSANT_OFFSET + board.en_passant[1]]
+    if board.turn == "white":
+        key ^= keys[TURN_OFFSET]
+    return key
+
+
+def to_book_move(board, move):
+    # Polyglot writes castling as the king taking its own rook
+    start, end = move[0], move[1]
+    piece = board.board[start[0]][start[1]]
+    if piece != 0 and piece.type == "king" and abs(end[1] - start[1]) == 2:
+        end = (end[0], 7 if end[1] == 6 else 0)
+    return encode_move((start, end) + tuple(move[2:]))
+
+
+def from_book_move(board, code):
+    move = decode_move(code)
+    start, end = move[0], move[1]
+    piece = board.board[start[0]][start[1]]
+    if piece != 0 and piece.type == "king" and start[1] == 4 and end[1] in (0, 7) and start[0] == end[0]:
+        return start, (end[0], 6 if end[1] == 7 else 2)
+    return move
+
+
+class OpeningBook:
+
+    def __init__(self, path, keys=None):
+        # keys is a Random64 table from load_keys, None to use zobrist.position_key
+        self.keys = keys
+        self.file = open(path, "rb")
+        size = self.file.seek(0, 2)
+        if size % ENTRY.size:
+            self.file.close()
+            raise BookError(f"{path} is not a book, its size isn't a multiple of {ENTRY.size} bytes")
+        self.size = size // ENTRY.size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def key(self, board):
+        return position_key(board) if self.keys is None else polyglot_hash(board, self.keys)
+
+    def _first(self, key):
+        # Index of the first entry with this key or a larger one
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, board):
+        # (move, weight) for every book move in the board's position that is legal there
+        key = self.key(board)
+        weights = {}
+        index = self._first(key)
+        while index < self.size:
+            entry_key, code, weight, _ = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            weights[from_book_move(board, code)] = weight
+            index += 1
+        # A different position with the same key can't be told apart, its moves are usually illegal here
+        return [(move, weights[move]) for move in board.filter_legal(weights)]
+
+    def choose(self, board, rng=random, best=False):
+        # A book move picked at random in proportion to its weight (or the heaviest one), None when out of book
+        found = [(move, weight) for move, weight in self.entries(board) if weight]
+        if not found:
+            return None
+        if best:
+            return max(found, key=lambda entry: entry[1])[0]
+        return rng.choices([move for move, _ in found], [weight for _, weight in found])[0]
+
+
+def build(games, board, plies=20, keys=None):
+    # Counts the moves played from every position in the first plies of each game: {(key, move code): count}
+    counts = Counter()
+    for game in games:
+        try:
+            for ply, move in enumerate(game.replay(board)):
+                if ply >= plies:
+                    break
+                # The replay has already played the move, step back to key it by the position it was played from
+                board.unmake_move()
+                key = position_key(board) if keys is None else polyglot_hash(board, keys)
+                counts[key, to_book_move(board, move)] += 1
+                board.make_move(move)
+        except NotationError:
+            # The moves up to a broken one still count
+            continue
+    return counts
+
+
+def write(path, counts):
+    # Writes {(key, move code): weight} as a sorted book, scaling the weights into 16 bits
+    scale = max(1, max(counts.values(), default=0) / 0xFFFF)
+    with open(path, "wb") as file:
+        for (key, code), count in sorted(counts.items()):
+            file.write(ENTRY.pack(key, code, max(1, int(count / scale)), 0))
+
+
+def check(games, book, board, plies=20):
+    # Probes the book the way a player would reach each position: loaded from its FEN rather than replayed, so
+    # a key that depends on the move order (castling, en passant) shows up as a miss. Every move in the first
+    # plies of each game should be found. Returns (moves checked, (game number, ply, FEN) for each one missing)
+    from internal import InternalBoard
+
+    lookup = InternalBoard()
+    checked, missing = 0, []
+    for number, game in enumerate(games):
+        try:
+            for ply, move in enumerate(game.replay(board)):
+                if ply >= plies:
+                    break
+                board.unmake_move()
+                load_fen(lookup, write_fen(board))
+                if move not in [entry for entry, _ in book.entries(lookup)]:
+                    missing.append((number, ply, write_fen(board)))
+                checked += 1
+                board.make_move(move)
+        except NotationError:
+            continue
+    return checked, missing
+
+
+def main():
+    from internal import InternalBoard
+
+    parser = argparse.ArgumentParser(description="Build or look up a Polyglot-layout opening book")
+    parser.add_argument("command", choices=["build", "probe", "check"])
+    parser.add_argument("files", nargs="+",
+                        help="build: PGN file and book to write, probe: book to read, check: PGN file and its book")
+    parser.add_argument("--keys", help="Random64 table for standard Polyglot keys, see load_keys")
+    parser.add_argument("--plies", type=int, default=20, help="how deep into each game to record moves")
+    parser.add_argument("--fen", help="position to look up, defaults to the starting position")
+    args = parser.parse_args()
+
+    keys = load_keys(args.keys) if args.keys else None
+    board = InternalBoard()
+    if args.command == "build":
+        if len(args.files) != 2:
+            parser.error("build needs a PGN file and the book to write")
+        start = time.perf_counter()
+        with open(args.files[0]) as file:
+            counts = build(read_games(file), board, args.plies, keys)
+        write(args.files[1], counts)
+        print(f"{len(counts)} entries in {time.perf_counter() - start:.2f}s")
+        return
+    if args.command == "check":
+        if len(args.files) != 2:
+            parser.error("check needs the PGN file and the book built from it")
+        with open(args.files[0]) as file, OpeningBook(args.files[1], keys) as book:
+            checked, missing = check(read_games(file), book, board, args.plies)
+        for number, ply, fen in missing:
+            print(f"Game {number}, ply {ply}: move missing from {fen}")
+        print(f"{checked} book moves probed from their FEN, {len(missing)} missing")
+        raise SystemExit(1 if missing else 0)
+
+    load_fen(board, args.fen or START_FEN)
+    with OpeningBook(args.files[0], keys) as book:
+        entries = book.entries(board)
+        total = sum(weight for _, weight in entries) or 1
+        for move, weight in sorted(entries, key=lambda entry: -entry[1]):
+            print(f"{move_name(move)}  {weight:>6}  {weight / total:.1%}")
+        if not entries:
+            print("Out of book")
+        start = time.perf_counter()
+        for _ in range(10000):
+            book.entries(board)
+        print(f"{(time.perf_counter() - start) * 100:.1f} us per probe over {len(book)} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Chess clock: per-player countdown with Fischer increment or simple delay and flag-fall detection
+# It only does time accounting against a monotonic clock, the UI decides when to look at it
+import time
+
+
+class ChessClock:
+
+    def __init__(self, initial=600, increment=0, delay=0, timer=time.monotonic):
+        # initial, increment and delay are in seconds. increment is added after every move,
+        # delay is the part of each move that doesn't come off the clock at all
+        self.initial = initial
+        self.increment = increment
+        self.delay = delay
+        self.timer = timer
+        self.reset()
+
+    def reset(self):
+        self.remaining = {"white": float(self.initial), "black": float(self.initial)}
+        self.turn = "white"
+        self.flagged = None
+        # When the current move started, None while the clock is stopped
+        self.started = None
+
+    def start(self):
+        if self.started is None and self.flagged is None:
+            self.started = self.timer()
+
+    def stop(self):
+        # Pausing keeps the time used so far on this move
+        if self.started is not None:
+            self.remaining[self.turn] = self.remaining_time(self.turn)
+            self.started = None
+
+    @property
+    def running(self):
+        return self.started is not None
+
+    def _used(self):
+        if self.started is None:
+            return 0.0
+        return max(0.0, self.timer() - self.started - self.delay)
+
+    def remaining_time(self, colour):
+        if colour != self.turn:
+            return self.remaining[colour]
+        return max(0.0, self.remaining[colour] - self._used())
+
+    def check_flag(self):
+        # Returns the colour whose time has run out, or None
+        if self.flagged is None and self.started is not None and self.remaining_time(self.turn) <= 0:
+            self.flagged = self.turn
+            self.remaining[self.turn] = 0.0
+            self.started = None
+        return self.flagged
+
+    def press(self):
+        # The side to move has finished its move, hand the clock to the other player
+        if self.check_flag() is not None:
+            return False
+        running = self.started is not None
+        self.remaining[self.turn] = self.remaining_time(self.turn) + self.increment
+        self.turn = "black" if self.turn == "white" else "white"
+        self.started = self.timer() if running else None
+        return True
+
+    def next_change(self):
+        # Seconds until the displayed whole seconds of the running clock change (or the flag falls),
+        # so the UI can wake up exactly then instead of polling
+        if self.started is None:
+            return None
+        waiting = max(0.0, self.started + self.delay - self.timer())
+        remaining = self.remaining_time(self.turn)
+        fraction = remaining % 1 or 1.0
+        return waiting + min(fraction, remaining)
+
+
+def format_time(seconds):
+    seconds = int(seconds + 0.999)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
@@ -0,0 +1,133 @@
+# Static evaluation of many positions at once with NumPy. A position is 64 small integers (0 for an empty square,
+# 1-6 for the white pawn to king, 7-12 for black), so a batch is an N x 64 array and its scores are one fancy-indexed
+# lookup into a (13, 64) table of material plus piece-square values and a sum along each row.
+# The table reproduces search.evaluate exactly, so batch and single scores can be mixed
+# Usage:
+#   python evaluation.py positions.txt > scores.csv       (one FEN per line)
+import sys
+import time
+
+import numpy as np
+
+from bitboard import PIECE_TYPES, COLOURS, squares, to_square
+from search import PIECE_VALUES, CENTRE_BONUS
+from notation import LETTERS
+
+CODES = {(type, colour): 1 + index + 6 * COLOURS.index(colour) for index, type in enumerate(PIECE_TYPES)
+         for colour in COLOURS}
+FEN_CODES = {(LETTERS[type].upper() if colour == "white" else LETTERS[type]): code
+             for (type, colour), code in CODES.items()}
+SQUARES = np.arange(64)
+
+
+def _build_table():
+    # White's view: material, a centre bonus for knights and bishops and a bonus for each row a pawn has advanced.
+    # Black's tables are white's mirrored top to bottom and negated
+    white = np.zeros((6, 64), dtype=np.int32)
+    for index, type in enumerate(PIECE_TYPES):
+        white[index] = PIECE_VALUES[type]
+        if type in ("knight", "bishop"):
+            white[index] += CENTRE_BONUS
+    rows = SQUARES // 8
+    white[0] += np.where((rows >= 1) & (rows <= 6), 4 * (rows - 1), 0)
+    black = -white.reshape(6, 8, 8)[:, ::-1].reshape(6, 64)
+    return np.vstack([np.zeros((1, 64), dtype=np.int32), white, black])
+
+
+TABLE = _build_table()
+
+
+def encode(board):
+    # An InternalBoard position as 64 codes
+    codes = bytearray(64)
+    for colour in COLOURS:
+        for type, mask in board.bitboards.pieces[colour].items():
+            for square in squares(mask):
+                codes[square] = CODES[type, colour]
+    return np.frombuffer(codes, dtype=np.int8)
+
+
+def _fen_codes(fen):
+    # The 64 codes as bytes and the side to move straight from a FEN, without setting up a board
+    placement, turn = fen.split()[:2]
+    codes = bytearray(64)
+    for row, rank in enumerate(reversed(placement.split("/"))):
+        square = row * 8
+        for char in rank:
+            if char.isdigit():
+                square += int(char)
+            else:
+                codes[square] = FEN_CODES[char]
+                square += 1
+    return codes, 1 if turn == "w" else -1
+
+
+def encode_fens(fens):
+    # (N x 64 codes, N turns of 1 for white to move or -1 for black) for a list of FENs
+    encoded = [_fen_codes(fen) for fen in fens]
+    positions = np.frombuffer(b"".join(codes for codes, _ in encoded), dtype=np.int8).reshape(-1, 64)
+    return positions, np.array([turn for _, turn in encoded], dtype=np.int64)
+
+
+def evaluate_batch(positions, turns=None):
+    # Scores for an N x 64 array of codes, from white's point of view, or from the side to move's
+    # if turns (1 for white, -1 for black per position) is given, like search.evaluate
+    scores = TABLE[positions.astype(np.intp), SQUARES].sum(axis=1)
+    if turns is not None:
+        scores *= turns
+    return scores
+
+
+def score_moves(board, moves=None):
+    # Static score of every move for the side playing it, by applying all the moves to copies of the encoded
+    # position at once instead of making and unmaking each one
+    if moves is None:
+        moves = board.legal_moves()
+    if not moves:
+        return []
+    root = encode(board)
+    count = len(moves)
+    starts = np.array([to_square(move[0]) for move in moves])
+    ends = np.array([to_square(move[1]) for move in moves])
+    pieces = root[starts]
+    placed = pieces.copy()
+    for index, move in enumerate(moves):
+        if len(move) > 2:
+            placed[index] = CODES[move[2], board.turn]
+    children = np.repeat(root[None, :], count, axis=0)
+    rows = np.arange(count)
+    children[rows, starts] = 0
+    children[rows, ends] = placed
+
+    # En passant removes a pawn beside the target square, castling moves the rook as well
+    pawn, king = CODES["pawn", board.turn], CODES["king", board.turn]
+    en_passant = (pieces == pawn) & (starts % 8 != ends % 8) & (root[ends] == 0)
+    children[rows[en_passant], (starts - starts % 8 + ends % 8)[en_passant]] = 0
+    castling = (pieces == king) & (np.abs(ends - starts) == 2)
+    if castling.any():
+        kingside = ends > starts
+        rook_starts = np.where(kingside, ends + 1, ends - 2)[castling]
+        rook_ends = np.where(kingside, ends - 1, ends + 1)[castling]
+        children[rows[castling], rook_ends] = children[rows[castling], rook_starts]
+        children[rows[castling], rook_starts] = 0
+
+    sign = 1 if board.turn == "white" else -1
+    return list(zip(moves, (evaluate_batch(children) * sign).tolist()))
+
+
+def main():
+    fens = [line.strip() for line in open(sys.argv[1]) if line.strip()]
+    start = time.perf_counter()
+    positions, turns = encode_fens(fens)
+    encoding = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = evaluate_batch(positions, turns)
+    scoring = time.perf_counter() - start
+    for fen, score in zip(fens, scores.tolist()):
+        print(f"{fen},{score}")
+    print(f"{len(fens)} positions: {encoding:.3f}s encoding, {scoring:.4f}s scoring "
+          f"({len(fens) / max(scoring, 1e-9):.0f} positions/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
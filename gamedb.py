@@ -0,0 +1,311 @@
+# Local game database: a game file from records.py plus an index of every position reached in its games.
+# The index holds one 16-byte entry (position key, game id, ply, move played next) per position, sorted by key,
+# so finding a position is a binary search over the memory-mapped file and its entries sit next to each other.
+# Keys are zobrist.position_key, so a position is found whichever move order reached it.
+# A game id is the game's place in the game file, the index also keeps each game's offset and result
+# Usage:
+#   python records.py pack games.pgn games.bin
+#   python gamedb.py build games.bin                 (writes games.bin.idx)
+#   python gamedb.py query games.bin --fen "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+#   python gamedb.py check games.bin --games 50      (every position of the first 50 games is found from its FEN)
+import os
+import sys
+import mmap
+import time
+import heapq
+import struct
+import argparse
+import tempfile
+from array import array
+
+from bitboard import decode_move
+from zobrist import position_key
+from records import RESULTS, RecordError, check_header, read_game, iter_games, unpack_position
+
+# Magic, version, game count, entry count, size of the game file the index was built from
+HEADER = struct.Struct("<4sHxxIQQ4x")
+ENTRY = struct.Struct("<QIHH")
+KEY = struct.Struct("<Q")
+OFFSET = struct.Struct("<Q")
+MAGIC = b"CHIX"
+VERSION = 3
+# Move code of a game's final position, nothing was played from it
+NO_MOVE = 0
+# Entries sorted in memory at a time while building, and entries per read or write of a temporary file
+RUN_SIZE = 1 << 20
+BLOCK = 1 << 12
+# Statistics column for each result index: none for "*", then white wins, black wins and draws
+COLUMNS = [0, 1, 3, 2]
+
+
+class DatabaseError(ValueError):
+    pass
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def _write_run(entries, directory):
+    # Sorts a batch of entries into a temporary file. Tuples sort by key, then by game and ply, which keeps a
+    # position's games in file order
+    entries.sort()
+    run = tempfile.TemporaryFile(dir=directory)
+    for start in range(0, len(entries), BLOCK):
+        run.write(b"".join(ENTRY.pack(*entry) for entry in entries[start:start + BLOCK]))
+    run.seek(0)
+    entries.clear()
+    return run
+
+
+def _read_run(run):
+    while block := run.read(ENTRY.size * BLOCK):
+        yield from ENTRY.iter_unpack(block)
+
+
+def _index_games(data, board, plies, runs, run_size, directory):
+    # (game offsets, results, entry count) of a game file, with the entries written to sorted runs of at most
+    # run_size entries. The records' views into data are gone once this returns
+    offsets, results, entries = array("Q"), bytearray(), []
+    count = 0
+    for game_id, game in enumerate(iter_games(data)):
+        offsets.append(game.offset)
+        results.append(RESULTS.index(game.result))
+        if game.start is None:
+            board.reset()
+        else:
+            unpack_position(game.start, board)
+        # The key before each move is keyed with that move, the one after the last move with NO_MOVE
+        codes = game.moves[:plies]
+        for ply, code in enumerate(codes):
+            entries.append((position_key(board), game_id, ply, code))
+            board.make_move(decode_move(code))
+        entries.append((position_key(board), game_id, len(codes), NO_MOVE))
+        if len(entries) >= run_size:
+            count += len(entries)
+            runs.append(_write_run(entries, directory))
+    if entries:
+        count += len(entries)
+        runs.append(_write_run(entries, directory))
+    return offsets, results, count
+
+
+def build(path, board, plies=None, run_size=RUN_SIZE):
+    # Replays every game in the game file at path and writes its index, plies limits how deep into each
+    # game positions are indexed. At most run_size entries are held in memory: each batch is sorted into a
+    # temporary file next to the index and the files are merged into it at the end. Returns (games, entries)
+    directory = os.path.dirname(os.path.abspath(path))
+    runs = []
+    try:
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            offsets, results, count = _index_games(data, board, plies, runs, run_size, directory)
+            size = len(data)
+        finally:
+            data.close()
+
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        with open(index_path(path), "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(offsets), count, size))
+            file.write(offsets.tobytes())
+            # Results are padded so the entries stay 8-byte aligned
+            file.write(results + bytes(-len(results) % 8))
+            block = []
+            for entry in heapq.merge(*map(_read_run, runs)):
+                block.append(ENTRY.pack(*entry))
+                if len(block) == BLOCK:
+                    file.write(b"".join(block))
+                    block.clear()
+            file.write(b"".join(block))
+    finally:
+        for run in runs:
+            run.close()
+    return len(offsets), count
+
+
+class GameDatabase:
+
+    def __init__(self, path):
+        # path is the game file, its index is expected next to it
+        self.games = self.index = None
+        try:
+            with open(path, "rb") as file:
+                self.games = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            check_header(self.games)
+            if not os.path.exists(index_path(path)):
+                raise DatabaseError(f"{path} has no index, build it with: python gamedb.py build {path}")
+            with open(index_path(path), "rb") as file:
+                self.index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self.index) < HEADER.size:
+                raise DatabaseError(f"{index_path(path)} is too short to be an index")
+            magic, version, self.game_count, self.size, games_size = HEADER.unpack_from(self.index)
+            if magic != MAGIC or version != VERSION:
+                raise DatabaseError(f"{index_path(path)} is not a version {VERSION} index")
+            if games_size != len(self.games):
+                raise DatabaseError(f"The index of {path} is out of date, rebuild it")
+        except (RecordError, DatabaseError):
+            self.close()
+            raise
+        self.results_start = HEADER.size + OFFSET.size * self.game_count
+        self.entries_start = self.results_start + self.game_count + (-self.game_count % 8)
+        if self.entries_start + ENTRY.size * self.size != len(self.index):
+            self.close()
+            raise DatabaseError(f"{index_path(path)} has the wrong size for its entries")
+
+    def __len__(self):
+        return self.game_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for data in (self.games, self.index):
+            if data is not None:
+                data.close()
+        self.games = self.index = None
+
+    def _first(self, key):
+        # Index of the first entry with this key or a larger one
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.index, self.entries_start + middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, key):
+        # (key, game id, ply, move code) for every entry with the key, read straight out of the mapping
+        first = self._first(key)
+        last = self._first(key + 1) if key < 0xFFFFFFFFFFFFFFFF else self.size
+        start = self.entries_start + first * ENTRY.size
+        with memoryview(self.index)[start:start + (last - first) * ENTRY.size] as view:
+            return list(ENTRY.iter_unpack(view))
+
+    def result(self, game_id):
+        return RESULTS[self.index[self.results_start + game_id]]
+
+    def game(self, game_id):
+        # The GameRecord with this id. Its moves point into the game file, so drop it before closing the database
+        if not 0 <= game_id < self.game_count:
+            raise DatabaseError(f"No game {game_id}, the database holds {self.game_count}")
+        offset = OFFSET.unpack_from(self.index, HEADER.size + OFFSET.size * game_id)[0]
+        return read_game(self.games, offset)[0]
+
+    def search(self, board):
+        # (game id, ply) of every time a game reached the board's position, ply being the number of moves
+        # played to get there
+        return [(game_id, ply) for _, game_id, ply, _ in self.entries(position_key(board))]
+
+    def statistics(self, board):
+        # {move: [times played, white wins, draws, black wins]} for the moves played from the board's position,
+        # most played first. Unfinished games count as played only
+        counts = {}
+        for _, game_id, _, code in self.entries(position_key(board)):
+            if code == NO_MOVE:
+                continue
+            if code not in counts:
+                counts[code] = [0, 0, 0, 0]
+            stats = counts[code]
+            stats[0] += 1
+            column = COLUMNS[self.index[self.results_start + game_id]]
+            if column:
+                stats[column] += 1
+        moves = {decode_move(code): stats for code, stats in counts.items()}
+        # Another position with the same key can't be told apart, its moves are usually illegal here
+        legal = board.filter_legal(moves)
+        return dict(sorted(((move, moves[move]) for move in legal), key=lambda item: -item[1][0]))
+
+    def replay(self, game_id, board, ply=None):
+        # Sets the board to the game's position after ply moves (the end of the game if None) by playing
+        # them through the board's move path, so unmake_move steps back through the game
+        game = self.game(game_id)
+        if game.start is None:
+            board.reset()
+        else:
+            unpack_position(game.start, board)
+        for code in game.moves[:ply]:
+            board.make_move(decode_move(code))
+        return board
+
+    def check(self, games=20, plies=None):
+        # Looks every position of the first games up again from its FEN, the way query --fen does, so a key that
+        # depends on how the position was reached shows up as a miss. Returns (positions checked, how many of
+        # those came after a castling move, (game id, ply) of each position that wasn't found)
+        from internal import InternalBoard
+        from notation import load_fen, write_fen
+
+        board, lookup = InternalBoard(), InternalBoard()
+        checked = castled = 0
+        missing = []
+        for game_id in range(min(games, self.game_count)):
+            self.replay(game_id, board, 0)
+            codes = [int(code) for code in self.game(game_id).moves[:plies]]
+            after_castling = False
+            for ply in range(len(codes) + 1):
+                load_fen(lookup, write_fen(board))
+                if (game_id, ply) not in self.search(lookup):
+                    missing.append((game_id, ply))
+                checked += 1
+                castled += after_castling
+                if ply < len(codes):
+                    move = decode_move(codes[ply])
+                    piece = board.board[move[0][0]][move[0][1]]
+                    after_castling |= piece.type == "king" and abs(move[1][1] - move[0][1]) == 2
+                    board.make_move(move)
+        return checked, castled, missing
+
+
+def main():
+    from internal import InternalBoard
+    from notation import START_FEN, load_fen, move_name, write_fen
+
+    parser = argparse.ArgumentParser(description="Index a game file and look positions up in it")
+    parser.add_argument("command", choices=["build", "query", "check"])
+    parser.add_argument("file", help="game file written by records.py")
+    parser.add_argument("--plies", type=int, help="build: only index this many moves into each game, check: give the same limit")
+    parser.add_argument("--run-size", type=int, default=RUN_SIZE,
+                        help="build: entries to sort in memory at a time, lower it to build in less memory")
+    parser.add_argument("--fen", help="query: position to look up, defaults to the starting position")
+    parser.add_argument("--games", type=int, default=5, help="query: how many of the matching games to list, check: how many games to look through")
+    args = parser.parse_args()
+
+    board = InternalBoard()
+    start = time.perf_counter()
+    if args.command == "build":
+        games, entries = build(args.file, board, args.plies, args.run_size)
+        print(f"{games} games, {entries} positions indexed in {time.perf_counter() - start:.2f}s")
+        return
+
+    if args.command == "check":
+        with GameDatabase(args.file) as database:
+            checked, castled, missing = database.check(args.games, args.plies)
+        for game_id, ply in missing:
+            print(f"Game {game_id}, move {ply}: not found from its FEN")
+        print(f"{checked} positions looked up from their FEN ({castled} after castling), {len(missing)} not found")
+        raise SystemExit(1 if missing else 0)
+
+    load_fen(board, args.fen or START_FEN)
+    with GameDatabase(args.file) as database:
+        start = time.perf_counter()
+        statistics = database.statistics(board)
+        elapsed = time.perf_counter() - start
+        for move, (played, white, draws, black) in statistics.items():
+            print(f"{move_name(move):<6} {played:>7}  +{white} ={draws} -{black}  "
+                  f"{(white + draws / 2) / max(white + draws + black, 1):.1%}")
+        if not statistics:
+            print("Not in the database")
+        print(f"Statistics in {elapsed * 1000:.2f} ms over {len(database)} games")
+        for game_id, ply in database.search(board)[:args.games]:
+            database.replay(game_id, board, ply)
+            print(f"Game {game_id} ({database.result(game_id)}), move {ply}: {write_fen(board)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,22 @@
 import os
-import numpy as np
+import logging
+
+from bitboard import (
+    Bitboards, PIECE_TYPES, COLOURS, FULL, RAYS, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, PAWN_PUSHES, PAWN_DOUBLE_PUSHES,
+    ROOK_DIRECTIONS, BISHOP_DIRECTIONS, QUEEN_DIRECTIONS, bit, to_square, squares, ray_attacks, pawn_attacks
+)
+from zobrist import PIECE_KEYS, TURN_KEY, EN_PASSANT_KEYS, CASTLING_KEYS, hash_position
+
+log = logging.getLogger(__name__)
+# One structured record per move played through move_piece, see logs.configure
+move_log = logging.getLogger(__name__ + ".moves")
+
+# Pawns promote on the first and last rows
+BACK_RANKS = 0xFF | 0xFF << 56
+# Piece ranks for ordering captures, most valuable victim first and then least valuable attacker.
+# The king can only ever take an undefended piece, so its captures rank as the cheapest attacker
+ORDER_RANKS = {type: rank for rank, type in enumerate(PIECE_TYPES, 1)}
+ORDER_RANKS["king"] = 0
 
 
 class InternalBoard:
@@ -11,11 +28,23 @@ class InternalBoard:
         self.valid_moves = []
         self.white_checkmate, self.black_checkmate = False, False
         self.white_in_check, self.black_in_check = False, False
+        self.stalemate = False
         self.selected = None
         # Rules for castling
         self.white_king_moved, self.black_king_moved = False, False
         self.white_left_rook_moved, self.black_left_rook_moved = False, False
         self.white_right_rook_moved, self.black_right_rook_moved = False, False
+        # Square a pawn skipped over with a double step on the last move, if any
+        self.en_passant = None
+        # Undo records for unmake_move, one per move made
+        self.history = []
+        # Zobrist key of the current position
+        self.hash = 0
+        self.halfmove_clock, self.fullmove_number = 0, 1
+        # Squares highlighted after the last click, so the UI can be told what changed
+        self.highlighted = set()
+        # Legal moves of the current position by origin square, worked out at most once per position
+        self._moves_by_square = None
 
     def start(self):
         self.reset()
@@ -29,7 +58,7 @@ class InternalBoard:
             # If it's a blank square then try and move the selected piece to that square
             if square_contents == 0:
                 if pos in self.get_valid_moves():
-                    print(f"Moved piece {self.piece_at(self.selected)} from {self.selected} to {pos}")
+                    log.debug("Moved piece %s from %s to %s", self.piece_at(self.selected), self.selected, pos)
                     self.move_piece(pos)
                     self.selected = None
                 return self.board, []
@@ -39,17 +68,17 @@ class InternalBoard:
                 self.selected = pos
                 if self.piece_at(self.selected) != 0:  
                     if self.piece_at(self.selected).colour == self.turn: 
-                        print("Piece currently selected:", self.selected, self.piece_at(self.selected))
+                        log.debug("Piece currently selected: %s %s", self.selected, self.piece_at(self.selected))
                         # Return a new set of squares to be highlighted
                         return self.board, self.get_valid_moves()
             # If the player clicks on any other square, it must contain an opponent's piece
             if pos in self.get_valid_moves():
-                print(f"Moved piece {self.piece_at(self.selected)} from {self.selected} to {pos}")
+                log.debug("Moved piece %s from %s to %s", self.piece_at(self.selected), self.selected, pos)
                 if self.turn == "white":
                     self.white_taken.append(self.piece_at(pos))
                 else:
                     self.black_taken.append(self.piece_at(pos))
-                print(f"Taken piece {self.piece_at(pos)} at position {pos}")
+                log.debug("Taken piece %s at position %s", self.piece_at(pos), pos)
                 self.move_piece(pos)
                 self.selected = None
             return self.board, []
@@ -58,7 +87,7 @@ class InternalBoard:
             if self.piece_at(pos) != 0:
                 if self.piece_at(pos).colour == self.turn:
                     self.selected = pos
-                    print("Piece currently selected:", self.selected, self.piece_at(self.selected))
+                    log.debug("Piece currently selected: %s %s", self.selected, self.piece_at(self.selected))
             try:
                 # Ensure that the player is selecting one of their own pieces
                 if self.piece_at(self.selected).colour == self.turn:
@@ -71,156 +100,469 @@ class InternalBoard:
             except (AttributeError, TypeError):
                 return self.board, []
 
+    def process_click_changes(self, pos):
+        # Same as process_click, but returns only what the UI needs to repaint:
+        # The squares whose contents changed and the highlights that were added or removed
+        moves_made = len(self.history)
+        highlighted = set(self.process_click(pos)[1])
+        changed = self._last_move_squares() if len(self.history) > moves_made else set()
+        added, removed = highlighted - self.highlighted, self.highlighted - highlighted
+        self.highlighted = highlighted
+        return changed, added, removed
+
+    def _last_move_squares(self):
+        start, end, piece, captured, captured_pos = self.history[-1][:5]
+        changed = {start, end, captured_pos}
+        if piece.type == "king" and abs(end[1] - start[1]) == 2:
+            changed.update({(start[0], 0), (start[0], 3)} if end[1] == 2 else {(start[0], 7), (start[0], 5)})
+        return changed
+
     def move_piece(self, new_pos):
-        piece = self.piece_at(self.selected)
-        self.board[new_pos[0]][new_pos[1]] = piece
-        self.board[self.selected[0]][self.selected[1]] = 0
-        print("New board:")
-        print(self.board)
-        self.change_turn()
+        self.make_move((self.selected, new_pos))
+        # Generating the replies sets the check, checkmate and stalemate flags for the new side to move,
+        # and leaves them cached for the next selection
+        self.moves_by_square()
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("New board:\n%s", self.board_text())
+        log.debug("%s's turn", self.turn.capitalize())
+        if move_log.isEnabledFor(logging.DEBUG):
+            self._log_move()
+
+    def _log_move(self):
+        start, end, piece, captured = self.history[-1][:4]
+        move_log.debug("%s %s %s-%s", piece.colour, piece.type, start, end, extra={"event": {
+            "ply": len(self.history),
+            "colour": piece.colour,
+            "piece": piece.type,
+            "from": start,
+            "to": end,
+            "captured": captured.type if captured != 0 else None,
+            "hash": f"{self.hash:016x}",
+            "check": self.white_in_check or self.black_in_check,
+            "checkmate": self.white_checkmate or self.black_checkmate,
+            "stalemate": self.stalemate,
+        }})
+
+    def make_move(self, move):
+        # Play a (start, end) move, or (start, end, promotion type), recording only what unmake_move needs
+        start, end = move[0], move[1]
+        piece = self.board[start[0]][start[1]]
+        captured = self.board[end[0]][end[1]]
+        captured_pos = end
+        # A pawn moving diagonally onto an empty square is taking en passant
+        if piece.type == "pawn" and captured == 0 and start[1] != end[1]:
+            captured_pos = (start[0], end[1])
+            captured = self.board[captured_pos[0]][captured_pos[1]]
+        castling_rights = self._castling_rights()
+        self.history.append((start, end, piece, captured, captured_pos, castling_rights, self.en_passant,
+                             self.halfmove_clock, self.hash))
+        self._moves_by_square = None
+
+        key = self.hash ^ TURN_KEY ^ PIECE_KEYS[piece.colour][piece.type][to_square(start)]
+        if captured != 0:
+            self.bitboards.remove(to_square(captured_pos), captured)
+            self.board[captured_pos[0]][captured_pos[1]] = 0
+            key ^= PIECE_KEYS[captured.colour][captured.type][to_square(captured_pos)]
+        self.bitboards.remove(to_square(start), piece)
+        self.board[start[0]][start[1]] = 0
+        placed = piece
+        if piece.type == "pawn" and end[0] in (0, 7):
+            placed = Piece(move[2] if len(move) > 2 else "queen", piece.colour)
+        self.bitboards.add(to_square(end), placed)
+        self.board[end[0]][end[1]] = placed
+        key ^= PIECE_KEYS[placed.colour][placed.type][to_square(end)]
+
+        if self.en_passant is not None:
+            key ^= EN_PASSANT_KEYS[self.en_passant[1]]
+        self.en_passant = None
+        if piece.type == "pawn" and abs(end[0] - start[0]) == 2:
+            self.en_passant = ((start[0] + end[0]) // 2, start[1])
+            key ^= EN_PASSANT_KEYS[start[1]]
+        elif piece.type == "king" and abs(end[1] - start[1]) == 2:
+            rook_start, rook_end = self._move_castling_rook(start[0], end[1])
+            rook_keys = PIECE_KEYS[piece.colour]["rook"]
+            key ^= rook_keys[to_square(rook_start)] ^ rook_keys[to_square(rook_end)]
+        self._update_castling_rights(start, end)
+        self.hash = key ^ CASTLING_KEYS[castling_rights] ^ CASTLING_KEYS[self._castling_rights()]
+        # Moves since the last capture or pawn move, for the fifty move rule
+        self.halfmove_clock = 0 if captured != 0 or piece.type == "pawn" else self.halfmove_clock + 1
+        if piece.colour == "black":
+            self.fullmove_number += 1
+        self.turn = self._opponent()
+
+    def unmake_move(self):
+        start, end, piece, captured, captured_pos, castling_rights, en_passant, halfmove_clock, key = self.history.pop()
+        self._moves_by_square = None
+        placed = self.board[end[0]][end[1]]
+        self.bitboards.remove(to_square(end), placed)
+        self.board[end[0]][end[1]] = 0
+        self.bitboards.add(to_square(start), piece)
+        self.board[start[0]][start[1]] = piece
+        if captured != 0:
+            self.bitboards.add(to_square(captured_pos), captured)
+            self.board[captured_pos[0]][captured_pos[1]] = captured
+        if piece.type == "king" and abs(end[1] - start[1]) == 2:
+            self._move_castling_rook(start[0], end[1], undo=True)
+        self._set_castling_rights(castling_rights)
+        self.en_passant = en_passant
+        self.halfmove_clock = halfmove_clock
+        if piece.colour == "black":
+            self.fullmove_number -= 1
+        self.hash = key
+        self.turn = piece.colour
+
+    def _move_castling_rook(self, row, king_col, undo=False):
+        # The rook jumps from the corner to the square the king crossed
+        if king_col == 6:
+            start, end = (row, 7), (row, 5)
+        else:
+            start, end = (row, 0), (row, 3)
+        if undo:
+            start, end = end, start
+        rook = self.board[start[0]][start[1]]
+        self.bitboards.move(to_square(start), to_square(end), rook)
+        self.board[end[0]][end[1]] = rook
+        self.board[start[0]][start[1]] = 0
+        return start, end
+
+    def _castling_rights(self):
+        return (self.white_king_moved, self.white_left_rook_moved, self.white_right_rook_moved,
+                self.black_king_moved, self.black_left_rook_moved, self.black_right_rook_moved)
+
+    def _set_castling_rights(self, rights):
+        (self.white_king_moved, self.white_left_rook_moved, self.white_right_rook_moved,
+         self.black_king_moved, self.black_left_rook_moved, self.black_right_rook_moved) = rights
+
+    def _update_castling_rights(self, start, end):
+        # Moving the king or a rook, or having a rook captured in its corner, loses that right for good
+        for pos in (start, end):
+            if pos == (0, 4):
+                self.white_king_moved = True
+            elif pos == (0, 0):
+                self.white_left_rook_moved = True
+            elif pos == (0, 7):
+                self.white_right_rook_moved = True
+            elif pos == (7, 4):
+                self.black_king_moved = True
+            elif pos == (7, 0):
+                self.black_left_rook_moved = True
+            elif pos == (7, 7):
+                self.black_right_rook_moved = True
 
     def get_valid_moves(self):
-        piece = self.piece_at(self.selected)
-        row, col = self.selected
-        if piece.type == "pawn":
-            return self._valid_pawn(piece, row, col)
-        elif piece.type == "bishop":
-            return self._valid_direction(row, col, ["ne", "nw", "se", "sw"])
-        elif piece.type == "rook":
-            return self._valid_direction(row, col, ["up", "down", "left", "right"])
-        elif piece.type == "knight":
-            return self._valid_knight(row, col)
-        elif piece.type == "queen":
-            return self._valid_direction(row, col, ["up", "down", "left", "right", "ne", "nw", "se", "sw"])
-
-        return self._valid_king(row, col)
-
-    def _valid_direction(self, row, col, directions):
-        valid = []
-        for direction in self._get_directions(row, col, directions):
-            for pos in direction:
-                square_contents = self.piece_at(pos)
-                if hasattr(square_contents, "colour"):
-                    if square_contents.colour != self.turn:
-                        valid.append(pos)
-                    break
-                else:
-                    valid.append(pos)
-        return valid
-
-    def _valid_pawn(self, piece, row, col):
-        valid = []
-        starting_row = 1 if piece.colour == "white" else 6
-        if piece.colour == "white":
-            positions = [(row+1, col), (row+2, col), (row+1, col+1), (row+1, col-1)]
+        return list(self.moves_by_square().get(self.selected, []))
+
+    def moves_by_square(self):
+        # {origin: [targets]} for every piece of the side to move that has a legal move. Generated the first time
+        # the position is asked about and kept until a move is made, so selecting and moving pieces reuses it
+        if self._moves_by_square is None:
+            moves_by_square = {}
+            for move in self.legal_moves():
+                targets = moves_by_square.setdefault(move[0], [])
+                # The four promotions share a target square
+                if not targets or targets[-1] != move[1]:
+                    targets.append(move[1])
+            self._moves_by_square = moves_by_square
+        return self._moves_by_square
+
+    def legal_moves(self):
+        # Every legal move for the side to move in one pass: instead of trying each move and looking for check,
+        # targets are cut down with the opponent's attack map, the squares that block or capture a checker
+        # and the ray each pinned piece is allowed to stay on
+        in_check, check_mask, pins, attacked = self._legal_masks()
+        moves = []
+        for type, mask in self.bitboards.pieces[self.turn].items():
+            for square in squares(mask):
+                start = self.to_xy(square)
+                for target in squares(self._legal_targets(square, type, check_mask, pins, attacked)):
+                    end = self.to_xy(target)
+                    if type == "pawn" and end[0] in (0, 7):
+                        moves.extend((start, end, promotion) for promotion in ["queen", "rook", "bishop", "knight"])
+                    else:
+                        moves.append((start, end))
+        self._update_status(in_check, bool(moves))
+        return moves
+
+    def generate_moves(self, hash_move=None):
+        # Legal moves for the side to move, produced lazily in stages: the hash move if it is legal here, captures
+        # (and queen promotions) by most valuable victim / least valuable attacker, then quiet moves. Each stage is
+        # only worked out once the one before it is used up, so a caller that stops early skips the rest.
+        # Unlike legal_moves this leaves the check and mate flags alone, see in_check
+        in_check, check_mask, pins, attacked = self._legal_masks()
+        if hash_move is not None and self._is_legal_move(hash_move, check_mask, pins, attacked):
+            yield hash_move
         else:
-            positions = [(row-1, col), (row-2, col), (row-1, col+1), (row-1, col-1)]
-        for index, pos in enumerate(positions):
-            try:
-                square_contents = self.piece_at(pos)
-            except IndexError:
-                continue
-            if index == 1 and row == starting_row and square_contents == 0 \
-                    and self.piece_at(positions[0]) == 0:
-                valid.append(pos)
-            elif index == 0 and square_contents == 0:
-                valid.append(pos)
-            elif index in [2, 3] and square_contents != 0:
-                if square_contents.colour != self.turn:
-                    valid.append(pos)
-        return valid
-
-    def _valid_knight(self, row, col):
-        valid = []
-        positions = [
-            (row+1, col+2), (row+1, col-2), 
-            (row+2, col+1), (row+2, col-1),
-            (row-1, col-2), (row-1, col+2),
-            (row-2, col-1), (row-2, col+1)
-        ]
-        for pos in positions:
-            try:
-                square_contents = self.piece_at(pos)
-            except IndexError:
-                continue
-            if square_contents == 0:
-                valid.append(pos)
-            else:
-                if square_contents.colour != self.turn:
-                    valid.append(pos)
-        return valid
-
-    def _valid_king(self, row, col):
-        valid = []
-        positions = [
-            (row+1, col), (row, col+1),
-            (row-1, col), (row, col-1),
-            (row+1, col+1), (row+1, col-1), 
-            (row-1, col+1), (row-1, col-1)
-        ]
-        for pos in positions:
-            try:
-                square_contents = self.piece_at(pos)
-            except IndexError:
-                continue
-            if square_contents == 0:
-                valid.append(pos)
+            hash_move = None
+
+        board = self.board
+        targets = [(square, type, self._legal_targets(square, type, check_mask, pins, attacked))
+                   for type, mask in self.bitboards.pieces[self.turn].items() for square in squares(mask)]
+        enemies = self.bitboards.occupied[self._opponent()]
+        en_passant = bit(to_square(self.en_passant)) if self.en_passant is not None else 0
+
+        captures = []
+        for square, type, mask in targets:
+            if type == "pawn":
+                mask &= enemies | en_passant | BACK_RANKS
             else:
-                if square_contents.colour != self.turn:
-                    valid.append(pos)
-        """
-        if piece.colour == "white":
-            if self.white_king_moved is False and self.white_right_rook_moved is False:
-                if self.piece_at((row, col+1)) == 0 and self.piece_at((row, col+2)) == 0:
-                    valid.append(pos)
-            elif self.white_king_moved is False and self.white_left_rook_moved is False:
-                if self.piece_at((row, col-1)) == 0 and self.piece_at((row, col-2)) == 0 \
-                        and self.piece_at((row, col-3)) == 0:
-                    valid.append(pos)
+                mask &= enemies
+            start = self.to_xy(square)
+            attacker = ORDER_RANKS[type]
+            for target in squares(mask):
+                end = self.to_xy(target)
+                victim = board[end[0]][end[1]]
+                gain = ORDER_RANKS[victim.type] if victim != 0 else (ORDER_RANKS["pawn"] if bit(target) & en_passant else 0)
+                if type == "pawn" and end[0] in (0, 7):
+                    captures.append((attacker - 8 * (gain + ORDER_RANKS["queen"]), (start, end, "queen")))
+                    # Capturing underpromotions still belong here, quiet ones wait for the last stage
+                    if gain:
+                        captures.extend((attacker - 8 * (gain + ORDER_RANKS[promotion]), (start, end, promotion))
+                                        for promotion in ["rook", "bishop", "knight"])
+                else:
+                    captures.append((attacker - 8 * gain, (start, end)))
+        captures.sort(key=lambda capture: capture[0])
+        for _, move in captures:
+            if move != hash_move:
+                yield move
 
-        if piece.colour == "black":
-            if self.black_king_moved is False and self.black_right_rook_moved is False:
-                if self.piece_at((row, col+1)) == 0 and self.piece_at((row, col+2)) == 0:
-                    valid.append(pos)
-            elif self.black_king_moved is False and self.right_left_rook_moved is False:
-                if self.piece_at((row, col-1)) == 0 and self.piece_at((row, col-2)) == 0 \
-                        and self.piece_at((row, col-3)) == 0:
-                    valid.append(pos)
-        """
-        return valid
-
-    def _get_directions(self, row, col, directions):
-        output = []
-        up = [(row-i, col) for i in range(1, 8) if (row-i) >= 0]
-        down = [(row+i, col) for i in range(1, 8) if (row+i) < 8]
-        left = [(row, col-i) for i in range(1, 8) if (col-i) >= 0]
-        right = [(row, col+i) for i in range(1, 8) if (col+i) < 8]
-        ne = [(row-i, col+i) for i in range(1, 8) if (row-i) >= 0 and (col+i) < 8]
-        nw = [(row-i, col-i) for i in range(1, 8) if (row-i) >= 0 and (col-i) >= 0]
-        se = [(row+i, col+i) for i in range(1, 8) if (row+i) < 8 and (col+i) < 8]
-        sw = [(row+i, col-i) for i in range(1, 8) if (row+i) < 8 and (col-i) >= 0]
-        for d in directions:
-            exec(f"""output.append({d})""")
-        return output
+        for square, type, mask in targets:
+            mask &= ~enemies
+            if type == "pawn":
+                mask &= ~en_passant
+            start = self.to_xy(square)
+            for target in squares(mask):
+                end = self.to_xy(target)
+                if type == "pawn" and end[0] in (0, 7):
+                    for promotion in ["rook", "bishop", "knight"]:
+                        if (start, end, promotion) != hash_move:
+                            yield start, end, promotion
+                elif (start, end) != hash_move:
+                    yield start, end
+
+    def has_legal_move(self):
+        # Stops at the first piece with anywhere to go, without building or ordering any moves
+        in_check, check_mask, pins, attacked = self._legal_masks()
+        for type, mask in self.bitboards.pieces[self.turn].items():
+            for square in squares(mask):
+                if self._legal_targets(square, type, check_mask, pins, attacked):
+                    return True
+        return False
+
+    def filter_legal(self, moves):
+        # The legal ones among moves from outside the move generator (book moves, say), without generating the rest
+        in_check, check_mask, pins, attacked = self._legal_masks()
+        return [move for move in moves if self._is_legal_move(move, check_mask, pins, attacked)]
+
+    def in_check(self):
+        king = self.bitboards.pieces[self.turn]["king"]
+        return bool(self._attackers(king.bit_length() - 1, self._opponent(), self.bitboards.all))
+
+    def _is_legal_move(self, move, check_mask, pins, attacked):
+        # Checks a move from elsewhere (a hash move, which may belong to a different position) against this one
+        start, end = move[0], move[1]
+        piece = self.board[start[0]][start[1]]
+        if piece == 0 or piece.colour != self.turn:
+            return False
+        if not self._legal_targets(to_square(start), piece.type, check_mask, pins, attacked) & bit(to_square(end)):
+            return False
+        return (piece.type == "pawn" and end[0] in (0, 7)) == (len(move) > 2)
+
+    def _update_status(self, in_check, has_moves):
+        if self.turn == "white":
+            self.white_in_check = in_check
+            self.white_checkmate = in_check and not has_moves
+        else:
+            self.black_in_check = in_check
+            self.black_checkmate = in_check and not has_moves
+        self.stalemate = not in_check and not has_moves
+
+    def _legal_masks(self):
+        # Returns whether the side to move is in check, the squares non-king moves must land on,
+        # the ray each pinned piece is limited to and every square the opponent attacks
+        us, them = self.turn, self._opponent()
+        enemy = self.bitboards.pieces[them]
+        occupied = self.bitboards.all
+        king = self.bitboards.pieces[us]["king"]
+        king_square = king.bit_length() - 1
+        # The king is taken off the board so it can't hide behind itself along a checking ray
+        attacked = self._attack_map(them, occupied ^ king)
+
+        checkers = self._attackers(king_square, them, occupied)
+        if not checkers:
+            check_mask = FULL
+        elif checkers & (checkers - 1):
+            # Double check, only the king can move
+            check_mask = 0
+        else:
+            check_mask = checkers
+            for direction in QUEEN_DIRECTIONS:
+                if RAYS[direction][king_square] & checkers:
+                    check_mask = ray_attacks(king_square, direction, occupied)
+                    break
+
+        pins = {}
+        for directions, sliders in [(ROOK_DIRECTIONS, enemy["rook"] | enemy["queen"]),
+                                    (BISHOP_DIRECTIONS, enemy["bishop"] | enemy["queen"])]:
+            for direction in directions:
+                if not RAYS[direction][king_square] & sliders:
+                    continue
+                blocker = ray_attacks(king_square, direction, occupied) & self.bitboards.occupied[us]
+                if blocker:
+                    beyond = ray_attacks(king_square, direction, occupied ^ blocker)
+                    if beyond & (occupied ^ blocker) & sliders:
+                        pins[blocker.bit_length() - 1] = beyond
+        return bool(checkers), check_mask, pins, attacked
+
+    def _legal_targets(self, square, type, check_mask, pins, attacked):
+        if type == "king":
+            targets = self._valid_king(square) & ~attacked
+            if check_mask == FULL:
+                targets |= self._valid_castling(square, attacked)
+            return targets
+        if type == "pawn":
+            targets = self._valid_pawn(square, self.turn)
+        elif type == "knight":
+            targets = self._valid_knight(square)
+        elif type == "bishop":
+            targets = self._valid_direction(square, BISHOP_DIRECTIONS)
+        elif type == "rook":
+            targets = self._valid_direction(square, ROOK_DIRECTIONS)
+        else:
+            targets = self._valid_direction(square, QUEEN_DIRECTIONS)
+        allowed = check_mask & pins.get(square, FULL)
+        if type == "pawn" and self.en_passant is not None:
+            en_passant = bit(to_square(self.en_passant))
+            if targets & en_passant and not self._en_passant_is_legal(square, check_mask, pins):
+                targets ^= en_passant
+            elif targets & en_passant:
+                # Taking the checking pawn en passant is allowed even though the pawn lands elsewhere
+                allowed |= en_passant
+        return targets & allowed
+
+    def _en_passant_is_legal(self, square, check_mask, pins):
+        en_passant = bit(to_square(self.en_passant))
+        captured = bit(square - square % 8 + self.en_passant[1])
+        if not en_passant & pins.get(square, FULL) or not (en_passant | captured) & check_mask:
+            return False
+        # Both pawns leave the row at once, which can uncover a rook or queen along it
+        occupied = (self.bitboards.all ^ bit(square) ^ captured) | en_passant
+        king_square = self.bitboards.pieces[self.turn]["king"].bit_length() - 1
+        return not self._attackers(king_square, self._opponent(), occupied) & ~captured
+
+    def _attackers(self, square, colour, occupied):
+        # Pieces of the given colour that attack the square
+        pieces = self.bitboards.pieces[colour]
+        attackers = KNIGHT_ATTACKS[square] & pieces["knight"]
+        attackers |= KING_ATTACKS[square] & pieces["king"]
+        attackers |= PAWN_ATTACKS["black" if colour == "white" else "white"][square] & pieces["pawn"]
+        rooks = pieces["rook"] | pieces["queen"]
+        if rooks:
+            for direction in ROOK_DIRECTIONS:
+                attackers |= ray_attacks(square, direction, occupied) & rooks
+        bishops = pieces["bishop"] | pieces["queen"]
+        if bishops:
+            for direction in BISHOP_DIRECTIONS:
+                attackers |= ray_attacks(square, direction, occupied) & bishops
+        return attackers
+
+    def _attack_map(self, colour, occupied):
+        # Every square the given colour attacks
+        pieces = self.bitboards.pieces[colour]
+        attacks = pawn_attacks(pieces["pawn"], colour)
+        for square in squares(pieces["knight"]):
+            attacks |= KNIGHT_ATTACKS[square]
+        for square in squares(pieces["king"]):
+            attacks |= KING_ATTACKS[square]
+        for square in squares(pieces["rook"] | pieces["queen"]):
+            for direction in ROOK_DIRECTIONS:
+                attacks |= ray_attacks(square, direction, occupied)
+        for square in squares(pieces["bishop"] | pieces["queen"]):
+            for direction in BISHOP_DIRECTIONS:
+                attacks |= ray_attacks(square, direction, occupied)
+        return attacks
+
+    def _valid_direction(self, square, directions):
+        targets = 0
+        for direction in directions:
+            targets |= ray_attacks(square, direction, self.bitboards.all)
+        return targets & ~self.bitboards.occupied[self.turn]
+
+    def _valid_pawn(self, square, colour):
+        empty = FULL ^ self.bitboards.all
+        targets = PAWN_PUSHES[colour][square] & empty
+        # The double step is only possible if the square in front is free as well
+        if targets:
+            targets |= PAWN_DOUBLE_PUSHES[colour][square] & empty
+        enemies = self.bitboards.occupied[self._opponent()]
+        if self.en_passant is not None:
+            enemies |= bit(to_square(self.en_passant))
+        return targets | PAWN_ATTACKS[colour][square] & enemies
+
+    def _valid_knight(self, square):
+        return KNIGHT_ATTACKS[square] & ~self.bitboards.occupied[self.turn]
+
+    def _valid_king(self, square):
+        return KING_ATTACKS[square] & ~self.bitboards.occupied[self.turn]
+
+    def _valid_castling(self, square, attacked):
+        # The king and rook must not have moved, the squares between them must be empty
+        # And the king can't cross or land on an attacked square
+        row = 0 if self.turn == "white" else 7
+        if square != row * 8 + 4 or getattr(self, f"{self.turn}_king_moved"):
+            return 0
+        rooks = self.bitboards.pieces[self.turn]["rook"]
+        targets = 0
+        if not getattr(self, f"{self.turn}_right_rook_moved") and rooks & bit(row * 8 + 7) \
+                and not self.bitboards.all & (0b01100000 << row * 8) and not attacked & (0b01110000 << row * 8):
+            targets |= bit(row * 8 + 6)
+        if not getattr(self, f"{self.turn}_left_rook_moved") and rooks & bit(row * 8) \
+                and not self.bitboards.all & (0b00001110 << row * 8) and not attacked & (0b00011100 << row * 8):
+            targets |= bit(row * 8 + 2)
+        return targets
+
+    def _opponent(self):
+        return "black" if self.turn == "white" else "white"
 
     def reset(self):
-        self.board = []
-        self.board.append([Piece(p, "white") for p in ["rook", "knight", "bishop", "queen", "king", "bishop", "knight", "rook"]])
-        self.board.append([Piece("pawn", "white")] * 8)
+        board = []
+        board.append([Piece(p, "white") for p in ["rook", "knight", "bishop", "queen", "king", "bishop", "knight", "rook"]])
+        board.append([Piece("pawn", "white")] * 8)
         for i in range(4):
-            self.board.append([0] * 8)
-        self.board.append([Piece("pawn", "black")] * 8)
-        self.board.append([Piece(p, "black") for p in ["rook", "knight", "bishop", "queen", "king", "bishop", "knight", "rook"]])
-        self.board = np.array(self.board).reshape(8, 8)
+            board.append([0] * 8)
+        board.append([Piece("pawn", "black")] * 8)
+        board.append([Piece(p, "black") for p in ["rook", "knight", "bishop", "queen", "king", "bishop", "knight", "rook"]])
+        self.set_position(board)
+
+    def set_position(self, board, turn="white", castling_rights=None, en_passant=None,
+                     halfmove_clock=0, fullmove_number=1):
+        # Load any 8x8 layout of pieces (0 for an empty square) with the given side to move
+        # castling_rights is the tuple of moved flags from _castling_rights(), by default nothing has moved
+        # Plain nested lists: square lookups are cheaper than on a NumPy object array and importing the engine
+        # doesn't have to load NumPy at all
+        self.board = [list(row) for row in board]
+        self.bitboards = Bitboards.from_board(self.board)
+        self.turn = turn
+        self.selected = None
+        self._set_castling_rights(castling_rights or (False,) * 6)
+        self.en_passant = en_passant
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        self.history = []
+        self._moves_by_square = None
+        self.hash = hash_position(self)
 
     def change_turn(self):
+        self._moves_by_square = None
         if self.turn == "white":
-            print("\nBlack's turn:")
+            log.debug("Black's turn")
             self.turn = "black"
         else:
-            print("\nWhite's turn:")
+            log.debug("White's turn")
             self.turn = "white"
 
+    def board_text(self):
+        return "\n".join(" ".join(str(square) for square in row) for row in self.board)
+
     def piece_at(self, pos: tuple):
         return self.board[pos[0]][pos[1]]
    
@@ -229,19 +571,39 @@ class InternalBoard:
 
 
 class Piece:
+    # There are only twelve distinct pieces, so Piece(type, colour) always hands back the same shared,
+    # read-only instance. Boards can then share pieces and copying a board never copies them
+    __slots__ = ("type", "colour", "image", "letter")
+    _instances = {}
+
+    def __new__(cls, type, colour):
+        piece = cls._instances.get((type, colour))
+        if piece is None:
+            if type not in PIECE_TYPES or colour not in COLOURS:
+                raise ValueError(f"Unknown piece {colour} {type}")
+            piece = super().__new__(cls)
+            letter = "n" if type == "knight" else type[0]
+            object.__setattr__(piece, "type", type)
+            object.__setattr__(piece, "colour", colour)
+            object.__setattr__(piece, "image", os.path.join(f"{colour} pieces", f"{type}.png"))
+            object.__setattr__(piece, "letter", letter.upper() if colour == "white" else letter)
+            cls._instances[(type, colour)] = piece
+        return piece
 
-    def __init__(self, type, colour):
-        self.type = type
-        self.colour = colour
-        self.image = os.path.join(f"{self.colour} pieces", f"{self.type}.png")
+    def __setattr__(self, name, value):
+        raise AttributeError("Pieces are shared between boards and can't be changed")
+
+    def __reduce__(self):
+        # Copies and pickles resolve back to the shared instance
+        return Piece, (self.type, self.colour)
 
     def __repr__(self):
-        letter = self.type[0]
-        if self.type == "knight":
-            letter = "n"
-        if self.colour == "white":
-            return letter.upper()
-        return letter.lower()
+        return self.letter
 
     def promote(self, new):
-        self.type = new
+        return Piece(new, self.colour)
+
+
+if os.environ.get("CHESS_PROFILE"):
+    import profiling
+    profiling.enable(InternalBoard, dump=os.environ["CHESS_PROFILE"])
@@ -1,5 +1,7 @@
 import os
-import numpy as np
+import logging
+
+log = logging.getLogger(__name__)
 
 
 class InternalBoard:
@@ -29,7 +31,7 @@ class InternalBoard:
             # If it's a blank square then try and move the selected piece to that square
             if square_contents == 0:
                 if pos in self.get_valid_moves():
-                    print(f"Moved piece {self.piece_at(self.selected)} from {self.selected} to {pos}")
+                    log.debug("Moved piece %s from %s to %s", self.piece_at(self.selected), self.selected, pos)
                     self.move_piece(pos)
                     self.selected = None
                 return self.board, []
@@ -39,17 +41,17 @@ class InternalBoard:
                 self.selected = pos
                 if self.piece_at(self.selected) != 0:  
                     if self.piece_at(self.selected).colour == self.turn: 
-                        print("Piece currently selected:", self.selected, self.piece_at(self.selected))
+                        log.debug("Piece currently selected: %s %s", self.selected, self.piece_at(self.selected))
                         # Return a new set of squares to be highlighted
                         return self.board, self.get_valid_moves()
             # If the player clicks on any other square, it must contain an opponent's piece
             if pos in self.get_valid_moves():
-                print(f"Moved piece {self.piece_at(self.selected)} from {self.selected} to {pos}")
+                log.debug("Moved piece %s from %s to %s", self.piece_at(self.selected), self.selected, pos)
                 if self.turn == "white":
                     self.white_taken.append(self.piece_at(pos))
                 else:
                     self.black_taken.append(self.piece_at(pos))
-                print(f"Taken piece {self.piece_at(pos)} at position {pos}")
+                log.debug("Taken piece %s at position %s", self.piece_at(pos), pos)
                 self.move_piece(pos)
                 self.selected = None
             return self.board, []
@@ -58,7 +60,7 @@ class InternalBoard:
             if self.piece_at(pos) != 0:
                 if self.piece_at(pos).colour == self.turn:
                     self.selected = pos
-                    print("Piece currently selected:", self.selected, self.piece_at(self.selected))
+                    log.debug("Piece currently selected: %s %s", self.selected, self.piece_at(self.selected))
             try:
                 # Ensure that the player is selecting one of their own pieces
                 if self.piece_at(self.selected).colour == self.turn:
@@ -75,8 +77,7 @@ class InternalBoard:
         piece = self.piece_at(self.selected)
         self.board[new_pos[0]][new_pos[1]] = piece
         self.board[self.selected[0]][self.selected[1]] = 0
-        print("New board:")
-        print(self.board)
+        log.debug("New board:\n%s", self.board)
         self.change_turn()
 
     def get_valid_moves(self):
@@ -212,14 +213,15 @@ class InternalBoard:
             self.board.append([Piece(None, None)] * 8)
         self.board.append([Piece("pawn", "black")] * 8)
         self.board.append([Piece(p, "black") for p in ["rook", "knight", "bishop", "queen", "king", "bishop", "knight", "rook"]])
+        import numpy as np
         self.board = np.array(self.board).reshape(8, 8)
 
     def change_turn(self):
         if self.turn == "white":
-            print("\nBlack's turn:")
+            log.debug("Black's turn")
             self.turn = "black"
         else:
-            print("\nWhite's turn:")
+            log.debug("White's turn")
             self.turn = "white"
 
     def piece_at(self, pos: tuple):
@@ -0,0 +1,32 @@
+# Logging setup for the engine and the windows. Nothing is configured by default, so the debug calls
+# in the move path are a level check and nothing else; turn them on with configure() or the environment:
+#   CHESS_LOG=DEBUG python ui.py
+#   CHESS_MOVE_LOG=moves.jsonl python ui.py
+import os
+import json
+import logging
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line, the record's "event" dict plus where and when it came from
+
+    def format(self, record):
+        event = dict(getattr(record, "event", None) or {"message": record.getMessage()})
+        event["time"] = record.created
+        event["logger"] = record.name
+        return json.dumps(event)
+
+
+def configure(level=None, move_events=None):
+    # level is a logging level name for the ordinary messages, move_events a file to stream structured
+    # move records to ("-" for stderr). Both fall back to CHESS_LOG and CHESS_MOVE_LOG
+    level = level or os.environ.get("CHESS_LOG", "WARNING")
+    move_events = move_events or os.environ.get("CHESS_MOVE_LOG")
+    logging.basicConfig(level=level.upper(), format="%(levelname)s %(name)s: %(message)s")
+    if move_events:
+        handler = logging.StreamHandler() if move_events == "-" else logging.FileHandler(move_events)
+        handler.setFormatter(JsonFormatter())
+        move_log = logging.getLogger("internal.moves")
+        move_log.setLevel(logging.DEBUG)
+        move_log.addHandler(handler)
+        move_log.propagate = False
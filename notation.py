@@ -0,0 +1,263 @@
+# FEN and PGN support for InternalBoard
+# Usage:
+#   python notation.py games.pgn          (replays every game in the file and reports throughput)
+import re
+import sys
+import time
+
+from internal import Piece
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+PIECE_LETTERS = {"p": "pawn", "n": "knight", "b": "bishop", "r": "rook", "q": "queen", "k": "king"}
+LETTERS = {type: letter for letter, type in PIECE_LETTERS.items()}
+FILES = "abcdefgh"
+
+
+class NotationError(ValueError):
+    pass
+
+
+def square_name(pos):
+    return FILES[pos[1]] + str(pos[0] + 1)
+
+
+def parse_square(name):
+    if len(name) != 2 or name[0] not in FILES or name[1] not in "12345678":
+        raise NotationError(f"Invalid square {name!r}")
+    return int(name[1]) - 1, FILES.index(name[0])
+
+
+def move_name(move):
+    # Coordinate notation, e.g. e2e4 or e7e8q
+    return square_name(move[0]) + square_name(move[1]) + (LETTERS[move[2]] if len(move) > 2 else "")
+
+
+def parse_move_name(name):
+    # The move for a coordinate notation name, the inverse of move_name
+    if len(name) not in (4, 5) or len(name) == 5 and name[4] not in PIECE_LETTERS:
+        raise NotationError(f"Invalid move {name!r}")
+    move = parse_square(name[:2]), parse_square(name[2:4])
+    return move + (PIECE_LETTERS[name[4]],) if len(name) == 5 else move
+
+
+def load_fen(board, fen):
+    fields = fen.split()
+    if len(fields) < 2:
+        raise NotationError(f"Invalid FEN {fen!r}")
+    placement, turn = fields[0], fields[1]
+    castling = fields[2] if len(fields) > 2 else "-"
+    en_passant = fields[3] if len(fields) > 3 else "-"
+    halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+    fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+
+    ranks = placement.split("/")
+    if len(ranks) != 8:
+        raise NotationError(f"Invalid FEN placement {placement!r}")
+    rows = []
+    # FEN lists the black back rank first, which is row 7 on the board
+    for rank in reversed(ranks):
+        row = []
+        for char in rank:
+            if char.isdigit():
+                row.extend([0] * int(char))
+            elif char.lower() in PIECE_LETTERS:
+                row.append(Piece(PIECE_LETTERS[char.lower()], "white" if char.isupper() else "black"))
+            else:
+                raise NotationError(f"Invalid FEN piece {char!r}")
+        if len(row) != 8:
+            raise NotationError(f"Invalid FEN rank {rank!r}")
+        rows.append(row)
+
+    # The board stores castling as "has it moved" flags, in the order used by _castling_rights()
+    castling_rights = (
+        "K" not in castling and "Q" not in castling, "Q" not in castling, "K" not in castling,
+        "k" not in castling and "q" not in castling, "q" not in castling, "k" not in castling,
+    )
+    board.set_position(rows, "white" if turn == "w" else "black", castling_rights,
+                       None if en_passant == "-" else parse_square(en_passant), halfmove_clock, fullmove_number)
+    return board
+
+
+def write_fen(board):
+    ranks = []
+    for row in reversed(range(8)):
+        rank, empty = "", 0
+        for col in range(8):
+            piece = board.board[row][col]
+            if piece == 0:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            letter = LETTERS[piece.type]
+            rank += letter.upper() if piece.colour == "white" else letter
+        ranks.append(rank + (str(empty) if empty else ""))
+
+    castling = ""
+    if not board.white_king_moved:
+        castling += ("K" if not board.white_right_rook_moved else "") + ("Q" if not board.white_left_rook_moved else "")
+    if not board.black_king_moved:
+        castling += ("k" if not board.black_right_rook_moved else "") + ("q" if not board.black_left_rook_moved else "")
+    en_passant = square_name(board.en_passant) if board.en_passant is not None else "-"
+    return " ".join(["/".join(ranks), board.turn[0], castling or "-", en_passant,
+                     str(board.halfmove_clock), str(board.fullmove_number)])
+
+
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+
+def san_to_move(board, san, moves=None):
+    # Find the legal move a SAN string such as Nbd7, exd6, e8=Q+ or O-O refers to
+    if moves is None:
+        moves = board.legal_moves()
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        row = 0 if board.turn == "white" else 7
+        end = (row, 6 if len(text) == 3 else 2)
+        for move in moves:
+            if move[0] == (row, 4) and move[1] == end and board.board[row][4].type == "king":
+                return move
+        raise NotationError(f"Illegal castling move {san!r}")
+
+    match = SAN_PATTERN.match(text)
+    if match is None:
+        raise NotationError(f"Invalid SAN move {san!r}")
+    letter, from_file, from_rank, target, promotion = match.groups()
+    type = PIECE_LETTERS[letter.lower()] if letter else "pawn"
+    end = parse_square(target)
+    promotion = PIECE_LETTERS[promotion.lower()] if promotion else None
+    found = None
+    for move in moves:
+        start = move[0]
+        if move[1] != end or board.board[start[0]][start[1]].type != type:
+            continue
+        if from_file is not None and start[1] != FILES.index(from_file):
+            continue
+        if from_rank is not None and start[0] != int(from_rank) - 1:
+            continue
+        if (move[2] if len(move) > 2 else None) != promotion:
+            continue
+        if found is not None:
+            raise NotationError(f"Ambiguous SAN move {san!r}")
+        found = move
+    if found is None:
+        raise NotationError(f"Illegal SAN move {san!r}")
+    return found
+
+
+def move_to_san(board, move, moves=None):
+    if moves is None:
+        moves = board.legal_moves()
+    start, end = move[0], move[1]
+    piece = board.board[start[0]][start[1]]
+    if piece.type == "king" and abs(end[1] - start[1]) == 2:
+        san = "O-O" if end[1] == 6 else "O-O-O"
+    else:
+        capture = board.board[end[0]][end[1]] != 0 or (piece.type == "pawn" and start[1] != end[1])
+        if piece.type == "pawn":
+            san = (FILES[start[1]] + "x" if capture else "") + square_name(end)
+            if len(move) > 2:
+                san += "=" + LETTERS[move[2]].upper()
+        else:
+            # Add the file, rank or both when another piece of the same type could reach the square
+            others = [m[0] for m in moves if m[1] == end and m[0] != start
+                      and board.board[m[0][0]][m[0][1]].type == piece.type]
+            prefix = ""
+            if others:
+                if all(other[1] != start[1] for other in others):
+                    prefix = FILES[start[1]]
+                elif all(other[0] != start[0] for other in others):
+                    prefix = str(start[0] + 1)
+                else:
+                    prefix = square_name(start)
+            san = LETTERS[piece.type].upper() + prefix + ("x" if capture else "") + square_name(end)
+    board.make_move(move)
+    if board.in_check():
+        san += "+" if board.has_legal_move() else "#"
+    board.unmake_move()
+    return san
+
+
+class Game:
+
+    def __init__(self, headers, moves, result):
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+
+    def __repr__(self):
+        return f"Game({self.headers.get('White', '?')} - {self.headers.get('Black', '?')}, {len(self.moves)} moves)"
+
+    def replay(self, board):
+        # Plays the game through the board's move path, yielding each move as it is made
+        load_fen(board, self.headers.get("FEN", START_FEN))
+        for san in self.moves:
+            move = san_to_move(board, san)
+            board.make_move(move)
+            yield move
+
+
+HEADER_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+TOKEN_PATTERN = re.compile(r"\{[^}]*\}?|;[^\n]*|\(|\)|\$\d+|\d+\.(?:\.\.)?|1-0|0-1|1/2-1/2|\*|[^\s{}();]+")
+RESULTS = {"1-0", "0-1", "1/2-1/2", "*"}
+
+
+def read_games(file):
+    # Yields one Game at a time from an open PGN file, holding only the current game in memory
+    headers, movetext = {}, []
+    for line in file:
+        line = line.strip()
+        if line.startswith("["):
+            # Headers after movetext start the next game
+            if movetext:
+                yield _parse_game(headers, movetext)
+                headers, movetext = {}, []
+            match = HEADER_PATTERN.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2)
+        elif line and not line.startswith("%"):
+            movetext.append(line)
+    if headers or movetext:
+        yield _parse_game(headers, movetext)
+
+
+def _parse_game(headers, movetext):
+    moves, result, depth = [], headers.get("Result", "*"), 0
+    for token in TOKEN_PATTERN.findall("\n".join(movetext)):
+        # Variations are skipped, only the main line is kept
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth or token[0] in "{;$" or token[0].isdigit() and token.endswith("."):
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return Game(headers, moves, result)
+
+
+def main():
+    from internal import InternalBoard
+
+    board = InternalBoard()
+    games = plies = errors = 0
+    start = time.perf_counter()
+    with open(sys.argv[1]) as file:
+        for game in read_games(file):
+            games += 1
+            try:
+                for _ in game.replay(board):
+                    plies += 1
+            except NotationError as error:
+                errors += 1
+                print(f"Game {games} ({game!r}): {error}")
+    elapsed = time.perf_counter() - start
+    print(f"{games} games, {plies} moves, {errors} errors in {elapsed:.2f}s "
+          f"({games / max(elapsed, 1e-9):.1f} games/s, {plies / max(elapsed, 1e-9):.0f} moves/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,11 @@
-try:
-    from PyQt5.QtWidgets import *
-    from PyQt5.QtGui import *
-    from PyQt5.QtCore import *
-    import numpy as np
-except ImportError:
-    import os
-    os.system("pip install PyQt5")
-    os.system("pip install PyQt5-tools")
-    os.system("pip install numpy")
-
-    from PyQt5.QtWidgets import *
-    from PyQt5.QtGui import *
-    from PyQt5.QtCore import *
-    import numpy as np
-
 import time
 import os
 import sys
 
+import numpy as np
+from PyQt5.QtGui import QIcon, QPixmap
+from PyQt5.QtWidgets import QApplication, QDialog, QFrame, QLabel
+
 
 # Complete game class for two players on the same device
 class Game(QDialog):
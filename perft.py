@@ -0,0 +1,167 @@
+# Perft: counts every leaf of the move tree to a given depth to check and time the move generator
+# Usage:
+#   python perft.py --depth 3                      (starting position)
+#   python perft.py --position kiwipete --depth 2 --divide
+#   python perft.py --suite --max-nodes 100000
+#   python perft.py --depth 5 --hash 64
+#   python perft.py --depth 3 --profile
+import time
+import argparse
+import importlib
+
+from notation import load_fen, move_name
+from zobrist import TranspositionTable
+import profiling
+
+# Standard reference positions and their published leaf counts for depth 1, 2, 3...
+POSITIONS = {
+    "start": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+              [20, 400, 8902, 197281, 4865609]),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 [48, 2039, 97862, 4085603]),
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  [14, 191, 2812, 43238, 674624]),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  [6, 264, 9467, 422333]),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  [44, 1486, 62379, 2103487]),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  [46, 2079, 89890, 3894594]),
+}
+
+
+# What a board class needs for perft to drive it
+REQUIRED = ("set_position", "legal_moves", "make_move", "unmake_move")
+
+
+class UnsupportedBoard(ValueError):
+    pass
+
+
+def check_board(board_class):
+    # internal_v2's board only answers clicks (its get_valid_moves doesn't filter by the selected piece)
+    # and keeps its own piece format, so its counts would mean nothing
+    missing = [name for name in REQUIRED if not hasattr(board_class, name)]
+    if missing:
+        raise UnsupportedBoard(f"{board_class.__module__}.{board_class.__name__} can't be used for perft, "
+                               f"it has no {', '.join(missing)}")
+
+
+def perft(board, depth, table=None):
+    if depth == 0:
+        return 1
+    # Subtrees already counted from a transposed position are looked up rather than walked again
+    if table is not None and depth > 1:
+        entry = table.probe(board.hash)
+        if entry is not None and entry[0] == depth:
+            return entry[1]
+    moves = board.legal_moves()
+    # Bulk count the last ply instead of playing every leaf move
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.make_move(move)
+        nodes += perft(board, depth - 1, table)
+        board.unmake_move()
+    if table is not None:
+        table.store(board.hash, depth, nodes)
+    return nodes
+
+
+def divide(board, depth, table=None):
+    breakdown = {}
+    for move in board.legal_moves():
+        board.make_move(move)
+        breakdown[move_name(move)] = perft(board, depth - 1, table)
+        board.unmake_move()
+    return breakdown
+
+
+def run(board_class, fen, depth, split=False, table=None):
+    board = load_fen(board_class(), fen)
+    start = time.perf_counter()
+    if split:
+        breakdown = divide(board, depth, table)
+        nodes = sum(breakdown.values())
+    else:
+        breakdown = None
+        nodes = perft(board, depth, table)
+    elapsed = time.perf_counter() - start
+    return nodes, breakdown, elapsed
+
+
+def run_suite(board_class, max_nodes, table=None):
+    passed = failed = 0
+    total_nodes = total_time = 0
+    for name, (fen, expected) in POSITIONS.items():
+        for depth, count in enumerate(expected, 1):
+            if count > max_nodes:
+                break
+            if table is not None:
+                table.clear()
+            nodes, _, elapsed = run(board_class, fen, depth, table=table)
+            total_nodes += nodes
+            total_time += elapsed
+            if nodes > max_nodes:
+                # A broken generator can blow far past the expected count, don't go any deeper
+                failed += 1
+                print(f"{name:<10} depth {depth}  {nodes:>9} nodes  FAIL (expected {count}), "
+                      f"over --max-nodes, skipping deeper depths")
+                break
+            if nodes == count:
+                passed += 1
+                result = "ok"
+            else:
+                failed += 1
+                result = f"FAIL (expected {count})"
+            print(f"{name:<10} depth {depth}  {nodes:>9} nodes  {nodes / max(elapsed, 1e-9):>10.0f} nodes/s  {result}")
+    print(f"\n{passed} passed, {failed} failed, {total_nodes / max(total_time, 1e-9):.0f} nodes/s overall")
+    return failed == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count move tree leaves to check and time move generation")
+    parser.add_argument("--board", default="internal", help="module providing InternalBoard")
+    parser.add_argument("--fen", help="position to search from, defaults to the starting position")
+    parser.add_argument("--position", choices=POSITIONS, default="start", help="named reference position")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--divide", action="store_true", help="show the leaf count below each root move")
+    parser.add_argument("--suite", action="store_true", help="check every reference position against its known counts")
+    parser.add_argument("--max-nodes", type=int, default=100000, help="deepest suite depth to run, by expected leaf count")
+    parser.add_argument("--hash", type=int, default=0, help="transposition table size in MB, 0 to disable")
+    parser.add_argument("--profile", action="store_true", help="show per-method call counts and timings afterwards")
+    args = parser.parse_args()
+
+    board_class = importlib.import_module(args.board).InternalBoard
+    try:
+        check_board(board_class)
+    except UnsupportedBoard as error:
+        parser.error(str(error))
+    if args.profile:
+        profiling.enable(board_class)
+    table = TranspositionTable(args.hash) if args.hash else None
+    if args.suite:
+        raise SystemExit(0 if run_suite(board_class, args.max_nodes, table) else 1)
+
+    fen = args.fen or POSITIONS[args.position][0]
+    nodes, breakdown, elapsed = run(board_class, fen, args.depth, args.divide, table)
+    if breakdown is not None:
+        for move, count in breakdown.items():
+            print(f"{move}: {count}")
+        print()
+    print(f"Nodes: {nodes}")
+    print(f"Time: {elapsed:.3f}s ({nodes / max(elapsed, 1e-9):.0f} nodes/s)")
+    if args.fen is None and args.depth <= len(POSITIONS[args.position][1]):
+        expected = POSITIONS[args.position][1][args.depth - 1]
+        print("Matches reference count" if nodes == expected else f"MISMATCH, expected {expected}")
+    if table is not None:
+        stats = table.stats()
+        print(f"Hash: {stats['hit_rate']:.1%} hits, {stats['collision_rate']:.1%} collisions over {stats['probes']} probes")
+    if args.profile:
+        print()
+        print(profiling.report())
+
+
+if __name__ == "__main__":
+    main()
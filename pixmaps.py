@@ -0,0 +1,43 @@
+import os
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPixmap
+
+
+class PixmapCache:
+    # Decodes every asset once and keeps pixmaps already scaled to the size they are drawn at,
+    # so redrawing the board never touches the filesystem
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.images = {}
+        self.pixmaps = {}
+
+    def image(self, name):
+        # Full size decoded image for an asset path relative to the assets folder
+        image = self.images.get(name)
+        if image is None:
+            image = QImage(os.path.join(self.base_path, name))
+            self.images[name] = image
+        return image
+
+    def get(self, type, colour, size):
+        # Pixmap for a piece at the given size, type and colour of None give the transparent square
+        key = (type, colour, size)
+        pixmap = self.pixmaps.get(key)
+        if pixmap is None:
+            name = os.path.join(f"{colour} pieces", f"{type}.png") if type is not None else "transparent.png"
+            scaled = self.image(name).scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            pixmap = QPixmap.fromImage(scaled)
+            self.pixmaps[key] = pixmap
+        return pixmap
+
+    def piece(self, piece, size):
+        # Same as get() for an InternalBoard square, which holds a Piece or 0
+        if piece == 0:
+            return self.get(None, None, size)
+        return self.get(piece.type, piece.colour, size)
+
+    def resize(self, size):
+        # Pixmaps scaled for any other size are no longer drawn, drop them
+        self.pixmaps = {key: pixmap for key, pixmap in self.pixmaps.items() if key[2] == size}
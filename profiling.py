@@ -0,0 +1,128 @@
+# Opt-in counters for the engine's entry points: calls, cumulative and worst latency, and how many moves each call
+# produced. enable() wraps the methods on the class and disable() puts the originals back, so while it is off
+# the engine runs its own code with nothing in the way
+#   profiling.enable(InternalBoard, dump="profile.json")  or  CHESS_PROFILE=profile.json python perft.py
+#   profiling.stats() / profiling.reset() / profiling.report()
+import json
+import atexit
+import functools
+from time import perf_counter_ns
+
+from bitboard import popcount
+
+
+def _count_moves(result):
+    # Target masks from the bitboard helpers, or lists of moves and squares
+    if isinstance(result, int):
+        return popcount(result)
+    return len(result)
+
+
+# Instrumented methods and how to count the moves in what they return. Timings are inclusive,
+# so process_click also contains the get_valid_moves and _valid_* calls it makes
+METHODS = {
+    "process_click": lambda result: _count_moves(result[1]),
+    "get_valid_moves": _count_moves,
+    "moves_by_square": lambda result: sum(map(len, result.values())),
+    "legal_moves": _count_moves,
+    "make_move": None,
+    "unmake_move": None,
+    "_legal_masks": None,
+    "_legal_targets": _count_moves,
+    "_valid_direction": _count_moves,
+    "_valid_pawn": _count_moves,
+    "_valid_knight": _count_moves,
+    "_valid_king": _count_moves,
+    "_valid_castling": _count_moves,
+    "_attack_map": None,
+}
+
+# name: [calls, total ns, max ns, moves]
+_counters = {}
+# (class, name): original method, for everything currently wrapped
+_originals = {}
+_dump_path = None
+
+
+def _wrap(name, method, count):
+    counter = _counters.setdefault(name, [0, 0, 0, 0])
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = perf_counter_ns()
+        result = method(*args, **kwargs)
+        elapsed = perf_counter_ns() - start
+        counter[0] += 1
+        counter[1] += elapsed
+        if elapsed > counter[2]:
+            counter[2] = elapsed
+        if count is not None:
+            counter[3] += count(result)
+        return result
+    return wrapper
+
+
+def enable(cls, dump=None, methods=None):
+    # Wraps the chosen methods (all of METHODS by default) on cls. dump is a file the stats are written to at exit
+    global _dump_path
+    for name in methods or METHODS:
+        if (cls, name) not in _originals and hasattr(cls, name):
+            _originals[(cls, name)] = getattr(cls, name)
+            setattr(cls, name, _wrap(name, _originals[(cls, name)], METHODS.get(name)))
+    if dump is not None:
+        if _dump_path is None:
+            atexit.register(_dump_at_exit)
+        _dump_path = dump
+
+
+def disable():
+    for (cls, name), method in _originals.items():
+        setattr(cls, name, method)
+    _originals.clear()
+
+
+def enabled():
+    return bool(_originals)
+
+
+def reset():
+    for counter in _counters.values():
+        counter[:] = [0, 0, 0, 0]
+
+
+def stats():
+    # Per method: calls, total and max seconds, mean microseconds per call, moves and moves per call
+    result = {}
+    for name, (calls, total, worst, moves) in _counters.items():
+        if not calls:
+            continue
+        result[name] = {
+            "calls": calls,
+            "total": total / 1e9,
+            "max": worst / 1e9,
+            "mean_us": total / calls / 1e3,
+        }
+        if METHODS.get(name) is not None:
+            result[name]["moves"] = moves
+            result[name]["moves_per_call"] = moves / calls
+    return result
+
+
+def dump(path):
+    with open(path, "w") as file:
+        json.dump(stats(), file, indent=2)
+
+
+def _dump_at_exit():
+    if _dump_path is not None:
+        dump(_dump_path)
+
+
+def report():
+    # The stats as a table, slowest methods first
+    lines = [f"{'method':<18}{'calls':>10}{'total s':>10}{'mean us':>10}{'max us':>10}{'moves/call':>12}"]
+    for name, entry in sorted(stats().items(), key=lambda item: -item[1]["total"]):
+        moves = f"{entry['moves_per_call']:.1f}" if "moves_per_call" in entry else "-"
+        lines.append(f"{name:<18}{entry['calls']:>10}{entry['total']:>10.3f}{entry['mean_us']:>10.1f}"
+                     f"{entry['max'] * 1e6:>10.0f}{moves:>12}")
+    return "\n".join(lines)
@@ -0,0 +1,243 @@
+# Compact binary positions and game records
+# A position packs into 32 bytes: the occupied squares as a 64-bit mask, one 4-bit piece code per occupied square
+# in square order, then the side to move, castling flags, en passant square and move counters.
+# A game file is an 8-byte file header (magic and version) followed by one record per game: a 4-byte header
+# (number of moves, result, flags), a packed start position if the game didn't start from the usual one, then a
+# 16-bit code per move.
+# Everything is little-endian, and readers slice the moves straight out of the file without copying
+# Usage:
+#   python records.py pack games.pgn games.bin        (or a selfplay .jsonl file)
+#   python records.py stats games.bin
+import sys
+import json
+import mmap
+import time
+import struct
+import argparse
+
+from bitboard import PIECE_TYPES, COLOURS, bit, squares, to_square, encode_move, decode_move
+from internal import Piece
+from notation import NotationError, read_games, parse_move_name
+
+# Occupied mask, piece nibbles, flags, en passant square, halfmove clock, fullmove number
+POSITION = struct.Struct("<Q16sBBBH3x")
+# Magic and version, padded to 8 bytes. There is no game count, files are appended to and read by scanning
+FILE_HEADER = struct.Struct("<4sH2x")
+GAME_HEADER = struct.Struct("<HBB")
+MAGIC = b"CHGR"
+VERSION = 1
+RESULTS = ["*", "1-0", "0-1", "1/2-1/2"]
+# Game header flags
+CUSTOM_START = 1
+NO_EN_PASSANT = 0xFF
+PIECES = [(type, colour) for colour in COLOURS for type in PIECE_TYPES]
+
+
+class RecordError(ValueError):
+    pass
+
+
+def pack_position(board):
+    occupied = board.bitboards.all
+    codes = {}
+    for colour in COLOURS:
+        for type, mask in board.bitboards.pieces[colour].items():
+            code = PIECES.index((type, colour))
+            for square in squares(mask):
+                codes[square] = code
+    nibbles = bytearray(16)
+    for index, square in enumerate(squares(occupied)):
+        nibbles[index >> 1] |= codes[square] << (4 * (index & 1))
+    # Bit 0 is black to move, then the six "has moved" castling flags in _castling_rights() order
+    flags = board.turn == "black"
+    for index, moved in enumerate(board._castling_rights()):
+        flags |= moved << (index + 1)
+    en_passant = NO_EN_PASSANT if board.en_passant is None else to_square(board.en_passant)
+    return POSITION.pack(occupied, bytes(nibbles), flags, en_passant, min(board.halfmove_clock, 255),
+                         board.fullmove_number)
+
+
+def unpack_position(data, board, offset=0):
+    # Sets the board up from a packed position in any buffer (bytes, memoryview, mmap) at the offset
+    occupied, nibbles, flags, en_passant, halfmove_clock, fullmove_number = POSITION.unpack_from(data, offset)
+    rows = [[0] * 8 for _ in range(8)]
+    for index, square in enumerate(squares(occupied)):
+        type, colour = PIECES[(nibbles[index >> 1] >> (4 * (index & 1))) & 15]
+        rows[square // 8][square % 8] = Piece(type, colour)
+    castling_rights = tuple(bool(flags & bit(index + 1)) for index in range(6))
+    board.set_position(rows, "black" if flags & 1 else "white", castling_rights,
+                       None if en_passant == NO_EN_PASSANT else divmod(en_passant, 8), halfmove_clock,
+                       fullmove_number)
+    return board
+
+
+class GameRecord:
+    # One game read from a file. moves is a memoryview of 16-bit move codes into the file's own buffer
+
+    __slots__ = ("offset", "result", "start", "moves")
+
+    def __init__(self, offset, result, start, moves):
+        self.offset = offset
+        self.result = result
+        self.start = start
+        self.moves = moves
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __repr__(self):
+        return f"GameRecord(offset={self.offset}, {len(self.moves)} moves, {self.result})"
+
+    def replay(self, board):
+        # Plays the game through the board's move path, yielding each move as it is made
+        if self.start is None:
+            board.reset()
+        else:
+            unpack_position(self.start, board)
+        for code in self.moves:
+            move = decode_move(code)
+            board.make_move(move)
+            yield move
+
+
+class GameWriter:
+    # Appends games to a game file. Records are gathered in memory and written in large blocks
+
+    def __init__(self, file, buffer_size=1 << 20):
+        self.file = file
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.count = 0
+        if file.tell() == 0:
+            file.write(FILE_HEADER.pack(MAGIC, VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def write(self, moves, result="*", start=None):
+        # moves are board move tuples, start a packed position if the game didn't begin from the usual one
+        if len(moves) > 0xFFFF:
+            raise RecordError(f"Games are limited to {0xFFFF} moves")
+        self.buffer += GAME_HEADER.pack(len(moves), RESULTS.index(result), CUSTOM_START if start else 0)
+        if start:
+            self.buffer += start
+        self.buffer += struct.pack(f"<{len(moves)}H", *map(encode_move, moves))
+        self.count += 1
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+
+def read_game(data, offset):
+    # (GameRecord at the offset of a buffer holding a game file, offset of the game after it)
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    plies, result, flags = GAME_HEADER.unpack_from(view, offset)
+    position = offset + GAME_HEADER.size
+    start = None
+    if flags & CUSTOM_START:
+        start = view[position:position + POSITION.size]
+        position += POSITION.size
+    end = position + 2 * plies
+    if end > len(view):
+        raise RecordError(f"Game at byte {offset} runs past the end of the file")
+    if sys.byteorder == "little":
+        moves = view[position:end].cast("H")
+    else:
+        moves = memoryview(struct.pack(f"{plies}H", *struct.unpack(f"<{plies}H", view[position:end])))
+    return GameRecord(offset, RESULTS[result], start, moves), end
+
+
+def check_header(data):
+    if len(data) < FILE_HEADER.size:
+        raise RecordError("Too short to be a game file")
+    magic, version = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise RecordError(f"Not a version {VERSION} game file")
+
+
+def iter_games(data):
+    # Yields a GameRecord for every game in a buffer holding a whole game file, slicing rather than copying
+    view = memoryview(data)
+    check_header(view)
+    offset = FILE_HEADER.size
+    while offset < len(view):
+        game, offset = read_game(view, offset)
+        yield game
+
+
+def open_games(path):
+    # (mmap of the file, game iterator). Close the mmap once the records are no longer needed
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return data, iter_games(data)
+
+
+def _read_source(path, board):
+    # (moves, result, packed start or None) for every game in a PGN or selfplay JSONL file
+    if path.endswith(".jsonl"):
+        with open(path) as file:
+            for line in file:
+                game = json.loads(line)
+                yield [parse_move_name(name) for name in game["moves"].split()], game["result"], None
+        return
+    with open(path) as file:
+        for game in read_games(file):
+            start = None
+            try:
+                moves = list(game.replay(board))
+            except NotationError:
+                continue
+            if "FEN" in game.headers:
+                for _ in moves:
+                    board.unmake_move()
+                start = pack_position(board)
+            yield moves, game.result if game.result in RESULTS else "*", start
+
+
+def main():
+    from internal import InternalBoard
+
+    parser = argparse.ArgumentParser(description="Convert games to the binary game format or read them back")
+    parser.add_argument("command", choices=["pack", "stats"])
+    parser.add_argument("files", nargs="+", help="pack: source PGN or JSONL and the file to write, stats: game file")
+    args = parser.parse_args()
+
+    board = InternalBoard()
+    start = time.perf_counter()
+    if args.command == "pack":
+        if len(args.files) != 2:
+            parser.error("pack needs a source file and the game file to write")
+        with open(args.files[1], "wb") as file, GameWriter(file) as writer:
+            for moves, result, start_position in _read_source(args.files[0], board):
+                writer.write(moves, result, start_position)
+            print(f"{writer.count} games written in {time.perf_counter() - start:.2f}s")
+        return
+
+    data, games = open_games(args.files[0])
+    count = plies = 0
+    game = None
+    for game in games:
+        count += 1
+        plies += len(game)
+    scanned = time.perf_counter() - start
+    print(f"{count} games, {plies} moves, {len(data)} bytes ({len(data) / max(count, 1):.0f} bytes per game), "
+          f"scanned in {scanned:.3f}s")
+    start = time.perf_counter()
+    for game in iter_games(data):
+        for _ in game.replay(board):
+            pass
+    elapsed = time.perf_counter() - start
+    print(f"Replayed through InternalBoard in {elapsed:.2f}s ({plies / max(elapsed, 1e-9):.0f} moves/s)")
+    # The records' move views point into the mapping, they have to go before it can be closed
+    del game
+    data.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+# Computer opponent: negamax alpha-beta search over InternalBoard.generate_moves with iterative deepening
+# Usage:
+#   python search.py --time 5
+#   python search.py --book book.bin
+#   python search.py --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1" --depth 4
+import time
+import argparse
+import itertools
+
+from bitboard import COLOURS, popcount, squares, encode_move, decode_move
+from zobrist import TranspositionTable, EXACT, LOWER, UPPER
+from notation import START_FEN, load_fen, move_name
+
+PIECE_VALUES = {"pawn": 100, "knight": 320, "bishop": 330, "rook": 500, "queen": 900, "king": 0}
+MATE = 100000
+# Any score past this is a forced mate, stored in the table relative to the position rather than the root
+MATE_BOUND = MATE - 1000
+INFINITY = MATE + 1
+# Small bonus for knights and bishops near the middle of the board
+CENTRE_BONUS = [(3 - min(row, 7 - row, col, 7 - col)) * -5 + 10 for row in range(8) for col in range(8)]
+
+
+def evaluate(board):
+    # Material and a little piece placement, from the point of view of the side to move
+    score = 0
+    for colour in COLOURS:
+        pieces = board.bitboards.pieces[colour]
+        side = 0
+        for type, mask in pieces.items():
+            side += PIECE_VALUES[type] * popcount(mask)
+        for square in squares(pieces["knight"] | pieces["bishop"]):
+            side += CENTRE_BONUS[square]
+        # Pawns are worth a little more the further they have advanced
+        for square in squares(pieces["pawn"]):
+            row = square // 8
+            side += 4 * (row - 1 if colour == "white" else 6 - row)
+        score += side if colour == board.turn else -side
+    return score
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchResult:
+
+    def __init__(self, best_move, score, depth, pv, nodes, elapsed):
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.pv = pv
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.nps = nodes / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return f"SearchResult(best_move={self.best_move}, score={self.score}, depth={self.depth}, nodes={self.nodes})"
+
+
+class Search:
+
+    def __init__(self, board, table=None, tablebases=None):
+        self.board = board
+        self.table = table if table is not None else TranspositionTable(16)
+        # Exact scores in the endings tablebase.Tablebases covers, instead of searching them
+        self.tablebases = tablebases
+        self.nodes = 0
+        self.stop = None
+
+    def search(self, max_depth=64, time_limit=None, node_limit=None, callback=None, stop=None):
+        # Deepen one ply at a time until the depth, time (seconds) or node budget runs out,
+        # callback(result) is called after every completed depth. stop is anything with an is_set() method
+        # (a threading or multiprocessing Event) that ends the search early when it becomes true
+        self.nodes = 0
+        self.node_limit = node_limit
+        self.stop = stop
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time + time_limit if time_limit is not None else None
+        self.table.new_search()
+
+        if self.tablebases is not None:
+            move = self.tablebases.best_move(self.board)
+            if move is not None:
+                score = self._tablebase_score(0)
+                return SearchResult(move, score, 0, [move], 0, time.perf_counter() - self.start_time)
+
+        result = None
+        for depth in range(1, max_depth + 1):
+            self.pv = [[] for _ in range(depth + 1)]
+            try:
+                score = self._negamax(depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                break
+            elapsed = time.perf_counter() - self.start_time
+            result = SearchResult(self.pv[0][0] if self.pv[0] else None, score, depth, list(self.pv[0]),
+                                  self.nodes, elapsed)
+            if callback is not None:
+                callback(result)
+            # No point searching deeper once a forced mate has been found or there is nothing to play
+            if not self.pv[0] or abs(score) > MATE_BOUND:
+                break
+        if result is None:
+            # Out of budget before depth 1 finished, fall back to any legal move
+            moves = self.board.legal_moves()
+            result = SearchResult(moves[0] if moves else None, 0, 0, moves[:1], self.nodes,
+                                  time.perf_counter() - self.start_time)
+        return result
+
+    def _check_limits(self):
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchTimeout
+        if self.stop is not None and self.stop.is_set():
+            raise SearchTimeout
+
+    def _negamax(self, depth, alpha, beta, ply):
+        self.nodes += 1
+        # The node budget is exact, the clock and the stop flag are looked at every 64 nodes
+        if self.nodes & 63 == 0 or self.nodes == self.node_limit:
+            self._check_limits()
+        board = self.board
+        # Cleared before any early return, so a parent never extends its line with one a sibling left behind
+        self.pv[ply] = []
+        if ply and self._is_repetition():
+            return 0
+        if self.tablebases is not None:
+            score = self._tablebase_score(ply)
+            if score is not None:
+                return score
+        if depth <= 0:
+            return self._quiesce(alpha, beta, ply)
+
+        key = board.hash
+        hash_move = None
+        entry = self.table.probe(key)
+        if entry is not None:
+            entry_depth, value, flag, code = entry
+            hash_move = decode_move(code) if code else None
+            if ply and entry_depth >= depth:
+                value = self._from_table(value, ply)
+                if flag == EXACT or (flag == LOWER and value >= beta) or (flag == UPPER and value <= alpha):
+                    return value
+
+        original_alpha = alpha
+        best_score, best_move = -INFINITY, None
+        # Moves arrive already ordered, a cutoff means the rest are never generated
+        for move in board.generate_moves(hash_move):
+            board.make_move(move)
+            try:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move()
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+                self.pv[ply] = [move] + self.pv[ply + 1]
+                if alpha >= beta:
+                    break
+        if best_move is None:
+            return -MATE + ply if board.in_check() else 0
+
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.store(key, depth, self._to_table(best_score, ply), flag, encode_move(best_move))
+        return best_score
+
+    def _quiesce(self, alpha, beta, ply):
+        # Only captures and promotions are searched past the horizon, so the score is taken from a quiet position
+        self.nodes += 1
+        if self.nodes & 63 == 0 or self.nodes == self.node_limit:
+            self._check_limits()
+        board = self.board
+        moves = board.generate_moves()
+        first = next(moves, None)
+        if first is None:
+            return -MATE + ply if board.in_check() else 0
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        # Captures and queen promotions come first, so the quiet moves after them are never generated
+        for move in itertools.chain([first], moves):
+            if not (self._is_capture(move) or move[2:] == ("queen",)):
+                break
+            board.make_move(move)
+            try:
+                score = -self._quiesce(-beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def _is_capture(self, move):
+        end = move[1]
+        if self.board.board[end[0]][end[1]] != 0:
+            return True
+        return end == self.board.en_passant and self.board.board[move[0][0]][move[0][1]].type == "pawn"
+
+    def _tablebase_score(self, ply):
+        found = self.tablebases.probe(self.board)
+        if found is None:
+            return None
+        result, plies = found
+        return result * (MATE - ply - plies)
+
+    def _is_repetition(self):
+        # Look back through the positions since the last capture or pawn move for the same hash
+        key = self.board.hash
+        for start, end, piece, captured, *_, previous in reversed(self.board.history):
+            if previous == key:
+                return True
+            if captured != 0 or piece.type == "pawn":
+                return False
+        return False
+
+    def _to_table(self, score, ply):
+        if score > MATE_BOUND:
+            return score + ply
+        if score < -MATE_BOUND:
+            return score - ply
+        return score
+
+    def _from_table(self, score, ply):
+        if score > MATE_BOUND:
+            return score - ply
+        if score < -MATE_BOUND:
+            return score + ply
+        return score
+
+
+def main():
+    from internal import InternalBoard
+
+    parser = argparse.ArgumentParser(description="Find the best move for the side to move")
+    parser.add_argument("--fen", help="position to search, defaults to the starting position")
+    parser.add_argument("--depth", type=int, default=64)
+    parser.add_argument("--time", type=float, help="time budget in seconds")
+    parser.add_argument("--nodes", type=int, help="node budget")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size in MB")
+    parser.add_argument("--tablebases", help="directory of endgame tables, see tablebase.py")
+    parser.add_argument("--book", help="opening book to answer from before searching, see book.py")
+    parser.add_argument("--book-keys", help="Random64 table the book is keyed with, if it is a standard Polyglot book")
+    args = parser.parse_args()
+
+    board = load_fen(InternalBoard(), args.fen or START_FEN)
+    if args.book:
+        from book import OpeningBook, load_keys
+
+        with OpeningBook(args.book, load_keys(args.book_keys) if args.book_keys else None) as book:
+            move = book.choose(board, best=True)
+        if move is not None:
+            print(f"bestmove {move_name(move)} (book)")
+            return
+    if args.time is None and args.nodes is None and args.depth == 64:
+        args.time = 5.0
+
+    def report(result):
+        print(f"depth {result.depth}  score {result.score}  nodes {result.nodes}  "
+              f"nps {result.nps:.0f}  time {result.elapsed:.2f}s  pv {' '.join(move_name(m) for m in result.pv)}")
+
+    tablebases = None
+    if args.tablebases:
+        from tablebase import Tablebases
+        tablebases = Tablebases(args.tablebases)
+    result = Search(board, TranspositionTable(args.hash), tablebases).search(args.depth, args.time, args.nodes, report)
+    print(f"bestmove {move_name(result.best_move) if result.best_move else '(none)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# Headless self-play: plays complete games on InternalBoard across a process pool and streams them to disk
+# Usage:
+#   python selfplay.py --games 10000 --workers 8 --out games.jsonl
+#   python selfplay.py --games 100 --policy search --nodes 500
+#   python selfplay.py --games 1000 --book book.bin
+import os
+import json
+import time
+import random
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from internal import InternalBoard
+from bitboard import popcount
+from search import Search
+from notation import move_name
+from zobrist import TranspositionTable
+from book import OpeningBook, load_keys
+
+
+def random_policy(board, moves, rng):
+    return rng.choice(moves)
+
+
+def search_policy(nodes):
+    table = TranspositionTable(4)
+
+    def choose(board, moves, rng):
+        return Search(board, table).search(node_limit=nodes).best_move or rng.choice(moves)
+    return choose
+
+
+def with_book(book, policy):
+    # Plays from the opening book while the position is in it, then hands over to the policy
+    def choose(board, moves, rng):
+        return book.choose(board, rng) or policy(board, moves, rng)
+    return choose
+
+
+def game_over(board, moves, positions):
+    # Returns (result, termination) once the game has finished, otherwise None
+    if not moves:
+        if getattr(board, f"{board.turn}_checkmate"):
+            return ("0-1" if board.turn == "white" else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if positions[board.hash] >= 3:
+        return "1/2-1/2", "repetition"
+    # Bare kings, or a king and a single minor piece against a bare king
+    pieces = board.bitboards.pieces
+    if not any(pieces[colour][type] for colour in pieces for type in ["pawn", "rook", "queen"]):
+        if popcount(board.bitboards.all) <= 3:
+            return "1/2-1/2", "insufficient material"
+    return None
+
+
+def play_game(game_id, policy, rng, max_plies=400):
+    board = InternalBoard()
+    board.reset()
+    positions = Counter([board.hash])
+    played = []
+    start = time.perf_counter()
+    while True:
+        moves = board.legal_moves()
+        finished = game_over(board, moves, positions)
+        if finished is not None:
+            result, termination = finished
+            break
+        if len(played) >= max_plies:
+            result, termination = "1/2-1/2", "move limit"
+            break
+        move = policy(board, moves, rng)
+        board.make_move(move)
+        played.append(move_name(move))
+        positions[board.hash] += 1
+    return {
+        "game": game_id,
+        "result": result,
+        "termination": termination,
+        "plies": len(played),
+        "moves": " ".join(played),
+        "worker": os.getpid(),
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def play_batch(first_id, count, policy_name, nodes, seed, max_plies, book=None, book_keys=None):
+    # Runs in a worker process, each batch gets its own seeded generator so runs are reproducible
+    rng = random.Random(seed + first_id)
+    policy = random_policy if policy_name == "random" else search_policy(nodes)
+    if book is not None:
+        # Memory-mapped, so every worker shares the one copy of the book in the page cache
+        policy = with_book(OpeningBook(book, load_keys(book_keys) if book_keys else None), policy)
+    return [play_game(game_id, policy, rng, max_plies) for game_id in range(first_id, first_id + count)]
+
+
+def run(games, workers, out, policy="random", nodes=500, seed=0, batch_size=10, max_plies=400, book=None,
+        book_keys=None):
+    # Only a few batches per worker are in flight at once and finished games go straight to the file,
+    # so memory stays flat however many games are played
+    start = time.perf_counter()
+    per_worker = {}
+    results = Counter()
+    next_id = 0
+    with open(out, "w") as file, ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        while next_id < games or pending:
+            while next_id < games and len(pending) < workers * 2:
+                count = min(batch_size, games - next_id)
+                pending.add(pool.submit(play_batch, next_id, count, policy, nodes, seed, max_plies, book, book_keys))
+                next_id += count
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for game in future.result():
+                    file.write(json.dumps(game) + "\n")
+                    results[game["result"]] += 1
+                    stats = per_worker.setdefault(game["worker"], {"games": 0, "plies": 0, "time": 0.0})
+                    stats["games"] += 1
+                    stats["plies"] += game["plies"]
+                    stats["time"] += game["elapsed"]
+    elapsed = time.perf_counter() - start
+    return elapsed, results, per_worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games between two computer players without a window")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default="selfplay.jsonl", help="file to write one JSON game per line to")
+    parser.add_argument("--policy", choices=["random", "search"], default="random")
+    parser.add_argument("--nodes", type=int, default=500, help="node budget per move for the search policy")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10, help="games sent to a worker at a time")
+    parser.add_argument("--max-plies", type=int, default=400)
+    parser.add_argument("--book", help="opening book to play from while in book, see book.py")
+    parser.add_argument("--book-keys", help="Random64 table the book is keyed with, if it is a standard Polyglot book")
+    args = parser.parse_args()
+
+    elapsed, results, per_worker = run(args.games, args.workers, args.out, args.policy, args.nodes,
+                                       args.seed, args.batch_size, args.max_plies, args.book, args.book_keys)
+    print(f"{args.games} games in {elapsed:.2f}s ({args.games / elapsed:.1f} games/s)")
+    print("Results:", ", ".join(f"{result}: {count}" for result, count in results.most_common()))
+    for worker, stats in sorted(per_worker.items()):
+        print(f"  worker {worker}: {stats['games']} games, {stats['games'] / stats['time']:.2f} games/s, "
+              f"{stats['plies'] / stats['time']:.0f} plies/s")
+
+
+if __name__ == "__main__":
+    main()
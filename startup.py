@@ -0,0 +1,68 @@
+# Import-time budget: imports each module in a fresh interpreter, checks it stays within its budget and that
+# the headless modules never pull in Qt or NumPy, so worker processes keep starting quickly
+# Usage:
+#   python startup.py
+#   python startup.py --repeat 10 internal selfplay
+import sys
+import json
+import argparse
+import subprocess
+
+# Milliseconds for the import itself, interpreter startup not included
+BUDGETS = {
+    "bitboard": 10,
+    "zobrist": 15,
+    "internal": 30,
+    "notation": 40,
+    "search": 40,
+    "perft": 40,
+    "selfplay": 100,
+    "analysis_process": 40,
+    "ui": 30,
+    "window": 250,
+}
+# Modules that must import without any of these
+HEADLESS = {"bitboard", "zobrist", "internal", "notation", "search", "perft", "selfplay", "analysis_process", "ui"}
+HEAVY = ("PyQt5", "numpy")
+
+MEASURE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed * 1000, sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy!r}))]))
+"""
+
+
+def measure(module, repeat=5):
+    # Best of repeat runs in fresh interpreters, and the heavy packages the import loaded
+    best, loaded = None, []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", MEASURE.format(module=module, heavy=HEAVY)],
+                                capture_output=True, text=True, check=True).stdout
+        elapsed, loaded = json.loads(output)
+        best = elapsed if best is None else min(best, elapsed)
+    return best, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check how long each module takes to import")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS))
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module, the fastest counts")
+    args = parser.parse_args()
+
+    failed = 0
+    for module in args.modules:
+        elapsed, loaded = measure(module, args.repeat)
+        problems = []
+        if elapsed > BUDGETS.get(module, float("inf")):
+            problems.append(f"over its {BUDGETS[module]} ms budget")
+        if module in HEADLESS and loaded:
+            problems.append(f"loads {', '.join(loaded)}")
+        failed += bool(problems)
+        print(f"{module:<18}{elapsed:>8.1f} ms  {'; '.join(problems) or 'ok'}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# Endgame tablebases for a lone king against king and queen, rook or pawn, built by retrograde analysis
+# Each table is a flat file of one byte per position, memory-mapped for probing, so a lookup is a single index
+# and every process probing the same table shares its pages
+# Usage:
+#   python tablebase.py generate KQK KRK KPK --dir tablebases
+#   python tablebase.py probe --fen "8/8/8/4k3/8/8/8/4K2R w - - 0 1" --dir tablebases
+import os
+import mmap
+import time
+import argparse
+
+from bitboard import (
+    KING_ATTACKS, PAWN_ATTACKS, ROOK_DIRECTIONS, QUEEN_DIRECTIONS, bit, popcount, ray_attacks
+)
+
+# Material sets and the piece that goes with the kings. KPK needs KQK and KRK to score its promotions
+TABLES = {"KQK": "queen", "KRK": "rook", "KPK": "pawn"}
+DEPENDENCIES = {"KPK": ["KQK", "KRK"]}
+# Positions are (side to move, strong king, weak king, strong piece) with the strong side as white and
+# 0 to move for the strong side, 1 for the weak side
+SIZE = 2 * 64 * 64 * 64
+# Each byte is 0 for a draw, 255 for an impossible position, otherwise 1 + plies to mate. Mate in an odd number
+# of plies is delivered by the side to move, an even number (0 when already mated) means the side to move is mated
+DRAW = 0
+ILLEGAL = 255
+WIN, LOSS = 1, -1
+DIRECTIONS = {"queen": QUEEN_DIRECTIONS, "rook": ROOK_DIRECTIONS}
+
+
+class TablebaseError(ValueError):
+    pass
+
+
+def index(turn, strong_king, weak_king, piece):
+    return ((turn * 64 + strong_king) * 64 + weak_king) * 64 + piece
+
+
+def piece_attacks(type, square, occupied):
+    if type == "pawn":
+        return PAWN_ATTACKS["white"][square]
+    attacks = 0
+    for direction in DIRECTIONS[type]:
+        attacks |= ray_attacks(square, direction, occupied)
+    return attacks
+
+
+def is_legal(type, turn, strong_king, weak_king, piece):
+    if len({strong_king, weak_king, piece}) < 3 or KING_ATTACKS[strong_king] & bit(weak_king):
+        return False
+    if type == "pawn" and piece // 8 in (0, 7):
+        return False
+    # The weak king can't be in check with the strong side to move
+    return turn == 1 or not piece_attacks(type, piece, bit(strong_king) | bit(weak_king)) & bit(weak_king)
+
+
+def weak_moves(type, strong_king, weak_king, piece):
+    # Where the lone king can go, and whether it is in check. Taking an undefended piece is a draw
+    in_check = bool(piece_attacks(type, piece, bit(strong_king) | bit(weak_king)) & bit(weak_king))
+    # Attacks through the king's own square count, it can't step back along the checking line
+    attacked = KING_ATTACKS[strong_king] | piece_attacks(type, piece, bit(strong_king))
+    targets = KING_ATTACKS[weak_king] & ~attacked
+    return targets, in_check
+
+
+def _squares(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def generate(type, dependencies=None):
+    # Returns the table for one material set as a bytearray, dependencies maps table names to the tables a
+    # promotion can lead to. Retrograde analysis: starting from the mates, every position whose value has just
+    # been settled passes it back to the positions one move before, in order of distance to mate
+    table = bytearray([ILLEGAL]) * SIZE
+    # Moves each weak-side position has that haven't been shown to lose yet
+    remaining = {}
+    # buckets[plies] holds positions that are known to be mate in at most that many plies
+    buckets = [[]]
+    for strong_king in range(64):
+        for weak_king in range(64):
+            for piece in range(64):
+                for turn in (0, 1):
+                    if is_legal(type, turn, strong_king, weak_king, piece):
+                        table[index(turn, strong_king, weak_king, piece)] = DRAW
+                if table[index(1, strong_king, weak_king, piece)] == ILLEGAL:
+                    continue
+                targets, in_check = weak_moves(type, strong_king, weak_king, piece)
+                if not targets and in_check:
+                    buckets[0].append(index(1, strong_king, weak_king, piece))
+                elif targets:
+                    remaining[index(1, strong_king, weak_king, piece)] = popcount(targets)
+
+    if type == "pawn":
+        # Promotions leave this table, their value comes from the queen and rook tables
+        for promoted in (dependencies or {}).values():
+            for strong_king in range(64):
+                for weak_king in range(64):
+                    for piece in range(48, 56):
+                        if table[index(0, strong_king, weak_king, piece)] == ILLEGAL or \
+                                piece + 8 in (strong_king, weak_king):
+                            continue
+                        value = promoted[index(1, strong_king, weak_king, piece + 8)]
+                        if value not in (DRAW, ILLEGAL) and (value - 1) % 2 == 0:
+                            _push(buckets, value, index(0, strong_king, weak_king, piece))
+
+    plies = 0
+    while plies < len(buckets):
+        for position in buckets[plies]:
+            if table[position] != DRAW:
+                continue
+            table[position] = plies + 1
+            turn, rest = divmod(position, 64 ** 3)
+            strong_king, rest = divmod(rest, 64 * 64)
+            weak_king, piece = divmod(rest, 64)
+            if turn == 1:
+                # Lost for the weak side: every strong move into it wins
+                for parent in _strong_parents(type, table, strong_king, weak_king, piece):
+                    if table[parent] == DRAW:
+                        _push(buckets, plies + 1, parent)
+            else:
+                # Won for the strong side: one fewer escape for the weak positions leading here
+                for parent in _weak_parents(table, strong_king, weak_king, piece):
+                    remaining[parent] -= 1
+                    if not remaining[parent]:
+                        _push(buckets, plies + 1, parent)
+        plies += 1
+    return table
+
+
+def _push(buckets, plies, position):
+    while len(buckets) <= plies:
+        buckets.append([])
+    buckets[plies].append(position)
+
+
+def _strong_parents(type, table, strong_king, weak_king, piece):
+    # Strong-side-to-move positions one move before, by unmaking a king or piece move
+    occupied = bit(strong_king) | bit(weak_king) | bit(piece)
+    for origin in _squares(KING_ATTACKS[strong_king] & ~occupied):
+        parent = index(0, origin, weak_king, piece)
+        if table[parent] != ILLEGAL:
+            yield parent
+    if type == "pawn":
+        origins = []
+        if piece - 8 >= 8 and not occupied & bit(piece - 8):
+            origins.append(piece - 8)
+            if piece // 8 == 3 and not occupied & bit(piece - 16):
+                origins.append(piece - 16)
+    else:
+        origins = _squares(piece_attacks(type, piece, occupied) & ~occupied)
+    for origin in origins:
+        parent = index(0, strong_king, weak_king, origin)
+        if table[parent] != ILLEGAL:
+            yield parent
+
+
+def _weak_parents(table, strong_king, weak_king, piece):
+    # Weak-side-to-move positions one king move before. The move was legal, the strong side being to move here
+    # means the king isn't in check
+    for origin in _squares(KING_ATTACKS[weak_king] & ~(bit(strong_king) | bit(piece))):
+        parent = index(1, strong_king, origin, piece)
+        if table[parent] != ILLEGAL:
+            yield parent
+
+
+class Tablebases:
+
+    def __init__(self, directory="tablebases"):
+        # Tables are opened the first time a position needs them, missing ones just aren't probed
+        self.directory = directory
+        self.tables = {}
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+    def _table(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.directory, f"{name}.tb")
+            table = None
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    if os.fstat(file.fileno()).st_size != SIZE:
+                        raise TablebaseError(f"{path} has the wrong size for a tablebase")
+                    table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.tables[name] = table
+        return self.tables[name]
+
+    def probe(self, board):
+        # (WIN, DRAW or LOSS for the side to move, plies to mate) for the board's position, None if it isn't
+        # covered. Playing on from a won position with the fastest mate takes exactly that many plies
+        if popcount(board.bitboards.all) != 3:
+            return None
+        pieces = board.bitboards.pieces
+        strong = "white" if popcount(board.bitboards.occupied["white"]) == 2 else "black"
+        weak = "black" if strong == "white" else "white"
+        for name, type in TABLES.items():
+            if pieces[strong][type]:
+                break
+        else:
+            return None
+        table = self._table(name)
+        if table is None:
+            return None
+        squares = [pieces[strong]["king"], pieces[weak]["king"], pieces[strong][type]]
+        squares = [mask.bit_length() - 1 for mask in squares]
+        if strong == "black":
+            # Flip the board so the strong side plays up it as white
+            squares = [square ^ 56 for square in squares]
+        value = table[index(0 if board.turn == strong else 1, *squares)]
+        if value == ILLEGAL:
+            return None
+        if value == DRAW:
+            return DRAW, 0
+        plies = value - 1
+        return (WIN if plies % 2 else LOSS), plies
+
+    def best_move(self, board):
+        # The move that keeps the result and mates fastest (or holds out longest), None if not covered
+        if self.probe(board) is None:
+            return None
+        best, best_key = None, None
+        for move in board.legal_moves():
+            board.make_move(move)
+            child = self.probe(board)
+            board.unmake_move()
+            # Anything the tables don't cover from here (a capture, an underpromotion) counts as a draw
+            result, plies = child if child is not None else (DRAW, 0)
+            # Lower is better for the mover: the child's result is from the opponent's side
+            key = (result, plies if result == LOSS else -plies)
+            if best_key is None or key < best_key:
+                best, best_key = move, key
+        return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate or probe endgame tablebases")
+    parser.add_argument("command", choices=["generate", "probe"])
+    parser.add_argument("tables", nargs="*", default=list(TABLES), help="material sets to generate")
+    parser.add_argument("--dir", default="tablebases", help="directory the tables are stored in")
+    parser.add_argument("--fen", help="position to probe")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        os.makedirs(args.dir, exist_ok=True)
+        built = {}
+        for name in sorted(args.tables, key=lambda name: name in DEPENDENCIES):
+            if name not in TABLES:
+                parser.error(f"Unknown table {name}, choose from {', '.join(TABLES)}")
+            dependencies = {}
+            for dependency in DEPENDENCIES.get(name, []):
+                if dependency not in built:
+                    with open(os.path.join(args.dir, f"{dependency}.tb"), "rb") as file:
+                        built[dependency] = file.read()
+                dependencies[dependency] = built[dependency]
+            start = time.perf_counter()
+            built[name] = generate(TABLES[name], dependencies)
+            with open(os.path.join(args.dir, f"{name}.tb"), "wb") as file:
+                file.write(built[name])
+            values = [value - 1 for value in built[name] if value not in (DRAW, ILLEGAL)]
+            print(f"{name}: {len(values)} decisive positions, longest mate {max(values, default=0)} plies, "
+                  f"{time.perf_counter() - start:.1f}s")
+        return
+
+    from internal import InternalBoard
+    from notation import load_fen, move_name
+
+    if args.fen is None:
+        parser.error("probe needs --fen")
+    board = load_fen(InternalBoard(), args.fen)
+    tablebases = Tablebases(args.dir)
+    found = tablebases.probe(board)
+    if found is None:
+        print("Not in the tablebases")
+        return
+    result, plies = found
+    print({WIN: f"Win, mate in {plies} plies", DRAW: "Draw", LOSS: f"Loss, mated in {plies} plies"}[result])
+    move = tablebases.best_move(board)
+    if move is not None:
+        print(f"bestmove {move_name(move)}")
+    start = time.perf_counter()
+    for _ in range(10000):
+        tablebases.probe(board)
+    print(f"{(time.perf_counter() - start) * 100:.2f} us per probe")
+
+
+if __name__ == "__main__":
+    main()
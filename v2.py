@@ -1,27 +1,35 @@
 import os, sys
 import ctypes
+import logging
 import math
 import time
 import threading
 
-try:
-    os.chdir(os.path.dirname(sys.argv[0]))
-except OSError:
-    pass
-finally:
-    user32 = ctypes.windll.user32
-
-import numpy as np
-from PyQt5.QtCore import *
-from PyQt5.QtGui import *
-from PyQt5.QtWidgets import *
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QFrame, QLabel, QMainWindow, QWidget
 from internal_v2 import InternalBoard
+from bitboard import RAY_POSITIONS
+from pixmaps import PixmapCache
+import logs
+
+log = logging.getLogger(__name__)
 
 
 roundToSigFig = lambda x, n: x if x == 0 else round(x, -int(math.floor(math.log10(abs(x)))) + (n - 1))
 centerOf = lambda i, j: (j[0] // 2 - i[0] // 2, j[1] // 2 - i[1] // 2)
 resolutions = {1280: 520, 1366: 520, 1920: 760, 2560: 920, 3440: 920, 3840: 1160, 4096: 1160}
-SCREEN_SIZE = user32.GetSystemMetrics(0), user32.GetSystemMetrics(1)
+
+
+def _screen_size():
+    # The board is sized for the monitor, ctypes.windll only exists on Windows
+    try:
+        user32 = ctypes.windll.user32
+    except AttributeError:
+        return 1920, 1080
+    return user32.GetSystemMetrics(0), user32.GetSystemMetrics(1)
+
+
+SCREEN_SIZE = _screen_size()
 BOARD_SIZE = resolutions.get(SCREEN_SIZE[0], 520)
 BOARD_OFFSET = centerOf((BOARD_SIZE, BOARD_SIZE), SCREEN_SIZE)
 SQUARE_SIZE = BOARD_SIZE // 8
@@ -32,6 +40,7 @@ BROWN = "68, 40, 28"
 WHITE = "217, 200, 168"
 HIGHLIGHT = "120, 150, 20, 160"
 BASE_PATH = os.path.join(os.path.dirname(sys.argv[0]), "assets")
+PIXMAPS = PixmapCache(BASE_PATH)
 
 
 class Piece(QLabel):
@@ -41,12 +50,14 @@ class Piece(QLabel):
         self.colour = colour
         self.xy = xy
         self.is_null = (self.type is None and self.colour is None and self.xy is None)
-        self.image = os.path.join(BASE_PATH, (os.path.join(f"{self.colour} pieces", f"{self.type}.png") if not self.is_null else "transparent.png"))
-        self.raw_image = QImage(self.image)
+        name = os.path.join(f"{self.colour} pieces", f"{self.type}.png") if not self.is_null else "transparent.png"
+        self.image = os.path.join(BASE_PATH, name)
+        # Every piece of a kind shares one decoded image and one pixmap scaled to the square
+        self.raw_image = PIXMAPS.image(name)
 
         super(Piece, self).__init__(**kwargs)
         self.setMouseTracking(True)
-        self.setPixmap(QPixmap.fromImage(self.raw_image))
+        self.setPixmap(PIXMAPS.get(self.type, self.colour, SQUARE_SIZE))
         self.parent = self.parent()
 
     def __repr__(self):
@@ -70,7 +81,7 @@ class Piece(QLabel):
 
     def mousePressEvent(self, event):
         self.valid_mouse_move = self.clicked_on_piece(event.pos()) and self.parent.piece_can_move(self)
-        print("VALID:", self.valid_mouse_move)
+        log.debug("Valid: %s", self.valid_mouse_move)
         self.mouse_press_pos = None
         self.mouse_move_pos = None
         self.prev_mouse_pos = self.x(), self.y()
@@ -132,9 +143,8 @@ class Board(QWidget):
             self.board.append([Piece(parent=self) for j in range(8)])
         self.board.append([Piece("pawn", "white", parent=self) for i in range(8)])
         self.board.append([Piece(p, "white", parent=self) for p in ["rook", "knight", "bishop", "queen", "king", "bishop", "knight", "rook"]])
-        print("BOARD:")
-        self.print_board()
-        print()
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Board:\n%s", self.board_text())
 
     def init_ui(self):
         for i in range(8):
@@ -146,28 +156,26 @@ class Board(QWidget):
                 piece.setScaledContents(True)
                 piece.setStyleSheet("background-color: transparent; border: none;")                
 
-    def print_board(self):
-        for row in self.board:
-            print(*row, sep=" ")
+    def board_text(self):
+        return "\n".join(" ".join(map(str, row)) for row in self.board)
 
     def draw_piece(self, piece, pos):
         piece.move(pos[0] * SQUARE_SIZE, pos[1] * SQUARE_SIZE)
 
     def move_piece(self, piece, old_pos, new_pos):
-        print(f"MOVING PIECE FROM {old_pos} TO {new_pos}:")
+        log.debug("Moving piece from %s to %s", old_pos, new_pos)
         self.draw_piece(piece, new_pos)
         self.board[old_pos[1]][old_pos[0]] = Piece()
         self.board[new_pos[1]][new_pos[0]] = piece    
         piece.xy = new_pos
         
-        print("NEW BOARD:")
-        self.print_board()
-        print() 
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("New board:\n%s", self.board_text())
         self.change_turn()
 
     def get_valid_moves(self, piece):
         row, col = piece.xy
-        print(piece, row, col, piece.type)
+        log.debug("Valid moves for %s at %s, %s", piece, row, col)
         if piece.type == "pawn":
             return self._valid_pawn(piece, row, col)
         elif piece.type == "bishop":
@@ -274,27 +282,19 @@ class Board(QWidget):
         return valid
 
     def _get_directions(self, row, col, directions):
-        output = []
-        up = [(row-i, col) for i in range(1, 8) if (row-i) >= 0]
-        down = [(row+i, col) for i in range(1, 8) if (row+i) < 8]
-        left = [(row, col-i) for i in range(1, 8) if (col-i) >= 0]
-        right = [(row, col+i) for i in range(1, 8) if (col+i) < 8]
-        ne = [(row-i, col+i) for i in range(1, 8) if (row-i) >= 0 and (col+i) < 8]
-        nw = [(row-i, col-i) for i in range(1, 8) if (row-i) >= 0 and (col-i) >= 0]
-        se = [(row+i, col+i) for i in range(1, 8) if (row+i) < 8 and (col+i) < 8]
-        sw = [(row+i, col-i) for i in range(1, 8) if (row+i) < 8 and (col-i) >= 0]
-        for d in directions:
-            output.append(eval(d))
-        return output
+        return [RAY_POSITIONS[d][row * 8 + col] for d in directions]
 
     def piece_can_move(self, piece):
         return piece.colour == self.turn
 
     def update(self, highlighted=None):
-        print(highlighted)
+        log.debug("Highlighted: %s", highlighted)
         for i in range(8):
             for j in range(8):
                 piece = self.board[j][i]
+                # Only pieces that have moved since the last update need placing again
+                if piece.xy == (i, j):
+                    continue
                 piece.xy = (i, j)
                 piece.setGeometry(i * SQUARE_SIZE, j * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
                 piece.raise_()
@@ -323,6 +323,7 @@ class Window(QMainWindow):
 
 
 if __name__ == "__main__":
+    logs.configure()
     app = QApplication(sys.argv)
     win = Window()
     win.showFullScreen()
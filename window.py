@@ -0,0 +1,245 @@
+# The Qt game window. Importing this loads the widgets, so only do it once a window is actually wanted:
+# ui.py imports it inside main(), which keeps processes that re-import the launcher (the spawned analysis worker) Qt-free
+import os
+import sys
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QCursor, QIcon, QPixmap
+from PyQt5.QtWidgets import QFrame, QLabel, QPushButton, QWidget
+
+from internal import InternalBoard, Piece
+from pixmaps import PixmapCache
+from clock import ChessClock, format_time
+
+
+class GameUI(QWidget):
+
+    def __init__(self, initial_time=600, increment=0, delay=0, analysis=False):
+        super().__init__()
+
+        # Window variables
+        self.base_path = os.path.join(os.path.dirname(sys.argv[0]), "assets")
+        self.pixmaps = PixmapCache(self.base_path)
+        self.width = 600
+        self.height = 660
+        self.white = (217, 200, 168)
+        self.brown = (68, 40, 28)
+        self.bg_colour = (49, 24, 11)
+        self.offset = self.height - self.width
+
+        # Board variables
+        self.board_size = 440
+        self.board_x = (self.width - self.board_size) // 2
+        self.board_y = (self.height + self.offset - self.board_size) // 2
+        self.square_size = self.board_size // 8
+        self.squares = {}
+        self.piece_padding = 3
+        self.piece_size = self.square_size - self.piece_padding * 2
+        self.selected = self.old_square = None
+        self.show_move_pos = (20, 20, 15, 15)
+
+        # Border variables
+        self.border_size = 528
+        self.border_x = (self.width - self.border_size) // 2
+        self.border_y = (self.height + self.offset - self.border_size) // 2
+
+        # Game variables
+        self.internal = InternalBoard()
+        self.clock = ChessClock(initial_time, increment, delay)
+        # Optional engine analysis of the position on the board, shown in the window title
+        self.analysis = None
+        if analysis:
+            # Only a window with analysis needs the worker process machinery
+            from analysis import AnalysisWorker
+            self.analysis = AnalysisWorker(self)
+            self.analysis.result.connect(self.show_analysis)
+
+        # Initialisation methods
+        self.init_styles()
+        self.init_ui()
+        self.update_window(self.internal.start())
+        self.setMouseTracking(True)
+        self.show()
+        self.start_clock()
+        if self.analysis is not None:
+            self.analysis.analyse(self.internal)
+
+    def init_ui(self):
+        # Create background
+        self.bg_path = os.path.join(self.base_path, "background.jpg")
+        self.bg = QPixmap(self.bg_path)
+        self.bg_label = QLabel(self)
+        self.bg_label.setScaledContents(True)
+        self.bg_label.setGeometry(0, 0, self.width, self.height)
+        self.bg_label.setPixmap(self.bg)
+
+        self.btns_frame = QFrame(self)
+        self.btns_frame.setGeometry(36, 36, self.border_size, 50)
+        self.btns_frame.setStyleSheet("")
+        
+        self.menu_btn = QPushButton(self.btns_frame)
+        self.menu_btn.setGeometry(0, 0, 150, 50)
+        self.menu_btn.setStyleSheet(self.btn_style)
+        self.menu_btn.setText("Main Menu")
+        self.menu_btn.setCursor(QCursor(Qt.PointingHandCursor))
+
+        self.timer_label = QLabel(self.btns_frame)
+        self.timer_label.setGeometry(200, 0, 128, 50)
+        self.timer_label.setAlignment(Qt.AlignCenter)
+        self.timer_label.setStyleSheet(self.timer_style)
+        
+        # The clock display is refreshed from the event loop, only when the shown time actually changes
+        self.clock_timer = QTimer(self)
+        self.clock_timer.setSingleShot(True)
+        self.clock_timer.timeout.connect(self.update_clock)
+
+        self.exit_btn = QPushButton(self.btns_frame)
+        self.exit_btn.setGeometry(378, 0, 150, 50)
+        self.exit_btn.setStyleSheet(self.btn_style)
+        self.exit_btn.setText("Save And Exit")
+        self.exit_btn.setCursor(QCursor(Qt.PointingHandCursor))
+
+        # Create border for the chess board
+        self.border_path = os.path.join(self.base_path, "border.png")
+        self.border_image = QPixmap(self.border_path)
+        self.border_label = QLabel(self)
+        self.border_label.setScaledContents(True)
+        self.border_label.setGeometry(self.border_x, self.border_y, self.border_size, self.border_size)
+        self.border_label.setPixmap(self.border_image)
+
+        # Create the chess board itself
+        self.board_frame = QFrame(self)
+        self.board_frame.setGeometry(self.board_x, self.board_y, self.board_size, self.board_size)
+        for i in range(8):
+            for j in range(8):
+                if (i + j) % 2 == 0:
+                    colour = self.white
+                else:
+                    colour = self.brown
+                square = QFrame(self.board_frame)
+                square.setGeometry(j * self.square_size, i * self.square_size, self.square_size, self.square_size)
+                square.setStyleSheet(f"background-color: rgb{str(colour)}; border: 2px solid rgb{str(colour)};")
+                piece = QLabel(square)
+                piece.setScaledContents(True)
+                piece.setGeometry(self.piece_padding, self.piece_padding, self.piece_size, self.piece_size)
+                # Highlighting flips a property instead of setting a new stylesheet on every move
+                piece.setStyleSheet(self.square_style)
+                self.squares[(i, j)] = piece
+
+        # Create window
+        self.setGeometry(50, 50, self.width, self.height)   
+        self.setWindowTitle("Chess")
+        self.setWindowIcon(QIcon(os.path.join(self.base_path, "window-icon.png")))
+
+    def init_styles(self):
+        self.win_style = f"""
+                        background-color: rgb{str(self.bg_colour)};
+                        border-radius: 10px;
+                        opacity: 100%;
+                          """
+
+        self.piece_style = """
+                        background-color: rgba(0, 0, 0, 0);
+                        border: none;
+                           """
+
+        self.timer_style = """
+                        background-color: rgb(217, 200, 168);
+                        border: 3px solid rgb(68, 40, 28);
+                        border-radius: 10px;
+                        font-size: 20px;
+                            """
+
+        self.square_style = """
+                        QLabel {
+                            background-color: rgba(0, 0, 0, 0);
+                        }
+
+                        QLabel[highlighted="true"] {
+                            background-color: rgba(120, 150, 20, 160);
+                            border-radius: 24px;
+                        }
+                            """
+
+        self.btn_style = """
+                        QPushButton {
+                            """ + self.timer_style + """
+                        }
+
+                        QPushButton::hover {
+                            background-color: rgb(135, 120, 100);
+                        }
+                            """
+
+    def start_clock(self):
+        self.clock.start()
+        self.update_clock()
+
+    def update_clock(self):
+        if self.clock.check_flag() is not None:
+            # The flag always falls for the side to move, whose time is the one on show
+            self.timer_label.setText("Time up")
+            return
+        self.timer_label.setText(format_time(self.clock.remaining_time(self.clock.turn)))
+        wait = self.clock.next_change()
+        if wait is not None:
+            # A millisecond late so the displayed second has definitely ticked over
+            self.clock_timer.start(int(wait * 1000) + 1)
+
+    def update_window(self, board, highlighted=[]):
+        for i, row in enumerate(board):
+            for j, square in enumerate(row):
+                label = self.squares[(i, j)]
+                label.setPixmap(self.pixmaps.piece(square, self.piece_size))
+                self.set_highlighted(label, (i, j) in highlighted)
+
+    def update_squares(self, changed, added, removed):
+        # Repaint only the squares the last click affected
+        for pos in changed:
+            self.squares[pos].setPixmap(self.pixmaps.piece(self.internal.piece_at(pos), self.piece_size))
+        for pos in added:
+            self.set_highlighted(self.squares[pos], True)
+        for pos in removed:
+            self.set_highlighted(self.squares[pos], False)
+
+    def set_highlighted(self, label, highlighted):
+        if label.property("highlighted") == highlighted:
+            return
+        label.setProperty("highlighted", highlighted)
+        # Re-apply the already parsed stylesheet for the new property value
+        label.style().unpolish(label)
+        label.style().polish(label)
+
+    def resizeEvent(self, event):
+        # Only pixmaps scaled to the current piece size are worth keeping
+        self.pixmaps.resize(self.piece_size)
+        super().resizeEvent(event)
+
+    def show_analysis(self, result):
+        score = result["score"] / 100
+        self.setWindowTitle(f"Chess - depth {result['depth']}: {' '.join(result['pv'][:4])} ({score:+.2f})")
+
+    def closeEvent(self, event):
+        self.clock.stop()
+        self.clock_timer.stop()
+        if self.analysis is not None:
+            self.analysis.shutdown()
+        super().closeEvent(event)
+
+    def mousePressEvent(self, event):
+        # No more moves once a flag has fallen
+        if self.clock.check_flag() is not None:
+            self.update_clock()
+            return
+        for i, s in enumerate(list(self.squares.values())):
+            if s.underMouse():
+                changed, added, removed = self.internal.process_click_changes(self.internal.to_xy(i))
+                if changed:
+                    self.clock.press()
+                    self.update_clock()
+                    # The old analysis is abandoned straight away, the worker moves on to the new position
+                    if self.analysis is not None:
+                        self.analysis.analyse(self.internal)
+                self.update_squares(changed, added, removed)
+                break
+
@@ -0,0 +1,136 @@
+# Zobrist hashing and a fixed-size transposition table keyed by the hash
+import random
+from array import array
+from itertools import product
+
+from bitboard import COLOURS, PIECE_TYPES, PAWN_ATTACKS, squares, to_square
+
+# Fixed seed so hashes are the same in every process and between runs
+_random = random.Random(0x5EED)
+PIECE_KEYS = {colour: {type: [_random.getrandbits(64) for _ in range(64)] for type in PIECE_TYPES}
+              for colour in COLOURS}
+TURN_KEY = _random.getrandbits(64)
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+# One key per castling right: white kingside, white queenside, black kingside, black queenside
+_RIGHT_KEYS = [_random.getrandbits(64) for _ in range(4)]
+
+
+def castling_rights(flags):
+    # The rights left by a board's six "has moved" flags (in _castling_rights() order), in _RIGHT_KEYS order
+    white_king, white_left, white_right, black_king, black_left, black_right = flags
+    return (not white_king and not white_right, not white_king and not white_left,
+            not black_king and not black_right, not black_king and not black_left)
+
+
+# Keyed by every set of flags up front so a move needs a single lookup. Different flags can leave the same
+# rights (a king that moved loses both, whatever its rooks did), and those share a key
+CASTLING_KEYS = {}
+for _flags in product((False, True), repeat=6):
+    CASTLING_KEYS[_flags] = 0
+    for _right, _key in zip(castling_rights(_flags), _RIGHT_KEYS):
+        if _right:
+            CASTLING_KEYS[_flags] ^= _key
+del _random, _flags, _right, _key
+
+
+def hash_position(board):
+    # Full hash of an InternalBoard, the move path keeps it up to date incrementally after this
+    key = 0
+    for colour in COLOURS:
+        for type, mask in board.bitboards.pieces[colour].items():
+            for square in squares(mask):
+                key ^= PIECE_KEYS[colour][type][square]
+    key ^= CASTLING_KEYS[board._castling_rights()]
+    if board.en_passant is not None:
+        key ^= EN_PASSANT_KEYS[board.en_passant[1]]
+    if board.turn == "black":
+        key ^= TURN_KEY
+    return key
+
+
+def position_key(board):
+    # The board's hash with the en passant file only counted when a pawn of the side to move could take there,
+    # the rule Polyglot uses, so the same position reached by different move orders gets the same key
+    key = board.hash
+    if board.en_passant is not None:
+        them = "black" if board.turn == "white" else "white"
+        if not PAWN_ATTACKS[them][to_square(board.en_passant)] & board.bitboards.pieces[board.turn]["pawn"]:
+            key ^= EN_PASSANT_KEYS[board.en_passant[1]]
+    return key
+
+
+# Entry flags, for search scores that are exact or only a bound
+EXACT, LOWER, UPPER = 0, 1, 2
+# Each slot is two unsigned 64-bit words: the full key and the packed entry
+ENTRY_SIZE = 16
+VALUE_OFFSET = 1 << 31
+
+
+class TranspositionTable:
+
+    def __init__(self, size_mb=16, replace="depth"):
+        # replace="depth" keeps the deeper entry when two positions share a slot (unless it is from an
+        # older search), replace="always" lets the newest entry win
+        if replace not in ("depth", "always"):
+            raise ValueError(f"Unknown replacement policy {replace!r}")
+        self.size = max(1, size_mb * 1024 * 1024 // ENTRY_SIZE)
+        self.replace = replace
+        self.keys = array("Q", bytes(8 * self.size))
+        self.data = array("Q", bytes(8 * self.size))
+        self.age = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = self.hits = self.collisions = 0
+        self.stores = self.overwrites = 0
+
+    def clear(self):
+        self.keys = array("Q", bytes(8 * self.size))
+        self.data = array("Q", bytes(8 * self.size))
+        self.age = 0
+        self.reset_stats()
+
+    def new_search(self):
+        # Entries from earlier searches become fair game for replacement
+        self.age = (self.age + 1) & 31
+
+    def probe(self, key):
+        # Returns (depth, value, flag, move code) or None
+        self.probes += 1
+        index = key % self.size
+        data = self.data[index]
+        if data == 0:
+            return None
+        if self.keys[index] != key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return ((data >> 32) & 0xFF, (data & 0xFFFFFFFF) - VALUE_OFFSET, (data >> 40) & 3, (data >> 42) & 0xFFFF)
+
+    def store(self, key, depth, value, flag=EXACT, move=0):
+        index = key % self.size
+        old = self.data[index]
+        if old != 0 and self.keys[index] != key:
+            if self.replace == "depth" and (old >> 58) & 31 == self.age and (old >> 32) & 0xFF > depth:
+                return
+            self.overwrites += 1
+        self.stores += 1
+        self.keys[index] = key
+        # Bit 63 is always set so an occupied slot can never read as empty
+        self.data[index] = (
+            (value + VALUE_OFFSET) & 0xFFFFFFFF | depth << 32 | flag << 40 | move << 42 | self.age << 58 | 1 << 63
+        ) & 0xFFFFFFFFFFFFFFFF
+
+    def stats(self):
+        used = sum(1 for data in self.data if data)
+        return {
+            "entries": self.size,
+            "used": used,
+            "probes": self.probes,
+            "hits": self.hits,
+            "collisions": self.collisions,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "collision_rate": self.collisions / self.probes if self.probes else 0.0,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+        }